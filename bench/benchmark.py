@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+    Codegen scale benchmark: times each stage on synthetic fleets,
+    results are printed as JSON. Run from repository root:
+
+    python3 bench/benchmark.py --sizes 100 1000 10000 --output bench.json
+"""
+
+import argparse
+import json
+import logging
+import os
+from pathlib import Path
+import platform
+import sys
+import tempfile
+
+import yaml
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from codegen import codegen
+from codegen.stats import Stats
+from synthetic import generate_fleet
+
+
+def bench_fleet(devices: int, configs: int, workdir: Path) -> dict:
+    """
+        Benchmark all stages on fleet of given size
+    """
+    config_path = workdir / 'config'
+    openhab_path = workdir / 'openhab'
+    generate_fleet(config_path, devices, configs)
+
+    stats = Stats()
+    cg = codegen.codegen(write=True, openhab_path=openhab_path)
+
+    with stats.stage('load'):
+        cg.load_config_yaml(config_path)
+
+    with stats.stage('construct'):
+        devices_obj = [
+            cg.device_registry.get_device(device, config['config'])
+            for config in cg.configs
+            for device in config['devices']
+        ]
+
+    with stats.stage('things'):
+        for device in devices_obj:
+            for thing in device.get_things():
+                thing.get_config()
+
+    with stats.stage('items'):
+        items = [device.get_items() for device in devices_obj]
+
+    with stats.stage('rules'):
+        for device in devices_obj:
+            device.get_rules_header()
+            device.get_rules()
+
+    with stats.stage('sitemap'):
+        for device_items in items:
+            for item in device_items:
+                item.get_sitemap_config()
+
+    with stats.stage('devices_yaml'):
+        z2m_devices_conf = {
+            device.get_device_address(): device.get_zigbee_device_config()
+            for device in devices_obj if device.is_zigbee()
+        }
+        yaml.dump(z2m_devices_conf)
+
+    with stats.stage('y2m'):
+        for device in devices_obj:
+            if device.has_y2m():
+                device.get_y2m_config()
+
+    # Full run: render all devices, then write files (first time and unchanged)
+    with stats.stage('render'):
+        cg.prepare_devices()
+
+    with stats.stage('write'):
+        cg.update_all()
+
+    with stats.stage('write_unchanged'):
+        cg.update_all()
+
+    # Full run into empty openHAB path (no manifest of previous run)
+    run_path = workdir / 'openhab_run'
+    cg = codegen.codegen(write=True, openhab_path=run_path)
+    with stats.stage('run_total'):
+        cg.load_config_yaml(config_path)
+        cg.run()
+
+    # Second run: inputs and outputs are not changed, nothing is rendered (manifest)
+    cg = codegen.codegen(write=True, openhab_path=run_path)
+    with stats.stage('run_up_to_date'):
+        cg.load_config_yaml(config_path)
+        cg.run()
+
+    return {
+        'devices': devices,
+        'configs': configs,
+        'stages': stats.get_report()['stages'],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Openhab codegen benchmark')
+    parser.add_argument(
+        '--sizes',
+        type=int,
+        nargs='+',
+        default=[100, 1000, 10000],
+        help='Fleet sizes (number of devices)',
+    )
+    parser.add_argument(
+        '--configs',
+        type=int,
+        default=4,
+        help='Number of config files in fleet',
+    )
+    parser.add_argument(
+        '--output',
+        type=Path,
+        default=None,
+        help='Write JSON results to file (default: stdout)',
+    )
+
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    results = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': [],
+    }
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory(prefix='codegen-bench-') as workdir:
+            # Generated diffs are not interesting here
+            stdout = sys.stdout
+            sys.stdout = open(os.devnull, 'w')
+            try:
+                result = bench_fleet(size, args.configs, Path(workdir))
+            finally:
+                sys.stdout.close()
+                sys.stdout = stdout
+        logging.warning("%d devices: %s", size, {k: v['wall'] for k, v in result['stages'].items()})
+        results['results'].append(result)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+    Startup time check: runs codegen CLI with -X importtime on single-device config,
+    reports slowest imports as JSON and fails if startup budget is exceeded
+    or heavy modules are imported eagerly (checked with --help). Run from repository root:
+
+    python3 bench/startup.py --budget-ms 250
+"""
+
+import argparse
+import json
+from pathlib import Path
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List
+
+ROOT_PATH = Path(__file__).parent.parent
+
+sys.path.insert(0, str(ROOT_PATH))
+
+from synthetic import generate_fleet
+
+# Modules, which must be imported only when needed
+LAZY_MODULES = [
+    'numpy',
+    'jinja2',
+    'pydoc_data',
+    'concurrent.futures',
+    'ctypes',
+]
+
+
+def parse_importtime(stderr: str) -> Dict[str, Dict[str, int]]:
+    """
+        Parse -X importtime output: module -> self and cumulative time (us)
+    """
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        if not self_us.strip().isdigit():
+            # Header line
+            continue
+        modules[name.strip()] = {
+            'self': int(self_us),
+            'cumulative': int(cumulative_us),
+            'top_level': not name[1:].startswith(' '),
+        }
+    return modules
+
+
+def measure(args: List[str]) -> Dict[str, Dict[str, int]]:
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', str(ROOT_PATH / 'codegen.py')] + args,
+        cwd=ROOT_PATH,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode:
+        raise RuntimeError(f"Codegen {' '.join(args)} failed:\n{proc.stderr[-2000:]}")
+    return parse_importtime(proc.stderr)
+
+
+def get_total(modules: Dict[str, Dict[str, int]]) -> int:
+    return sum(m['cumulative'] for m in modules.values() if m['top_level'])
+
+
+def measure_best(args: List[str], repeat: int) -> Dict[str, Dict[str, int]]:
+    """
+        Imports of run with smallest total import time
+    """
+    return min((measure(args) for _ in range(repeat)), key=get_total)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Openhab codegen startup time check')
+    parser.add_argument(
+        '--budget-ms',
+        type=float,
+        default=250,
+        help='Maximal total import time of single-device run, ms',
+    )
+    parser.add_argument(
+        '--repeat',
+        type=int,
+        default=5,
+        help='Number of runs, best one is reported',
+    )
+    parser.add_argument(
+        '--top',
+        type=int,
+        default=15,
+        help='Number of slowest modules to report',
+    )
+
+    args = parser.parse_args()
+
+    # Only startup: heavy modules must not be imported before they are needed
+    startup = measure_best(['--help'], args.repeat)
+    eager = [
+        name for name in LAZY_MODULES
+        if name in startup
+    ]
+
+    # Real invocation: diff of single-device config against empty openHAB path
+    with tempfile.TemporaryDirectory(prefix='codegen-startup-') as workdir:
+        generate_fleet(Path(workdir) / 'config', 1)
+        best = measure_best([str(Path(workdir) / 'config'), str(Path(workdir) / 'openhab')], args.repeat)
+    best_total = get_total(best)
+
+    slowest = sorted(best.items(), key=lambda m: m[1]['cumulative'], reverse=True)[:args.top]
+    report = {
+        'total_ms': round(best_total / 1000, 3),
+        'startup_ms': round(get_total(startup) / 1000, 3),
+        'budget_ms': args.budget_ms,
+        'eager_modules': eager,
+        'slowest': [
+            {'module': name, 'self_ms': m['self'] / 1000, 'cumulative_ms': m['cumulative'] / 1000}
+            for name, m in slowest
+        ],
+    }
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+    if eager:
+        sys.stderr.write(f"Modules imported on startup, must be lazy: {', '.join(eager)}\n")
+    if best_total / 1000 > args.budget_ms:
+        sys.stderr.write(f"Startup import time {best_total / 1000:.1f} ms exceeds budget {args.budget_ms} ms\n")
+    if eager or best_total / 1000 > args.budget_ms:
+        sys.exit(1)
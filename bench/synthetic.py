@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+    Synthetic fleet generator: creates <path>/conf/*.yaml and <path>/y2m.yaml
+    with devices of all types from codegen.devices.DEVICES
+"""
+
+import argparse
+import os
+from pathlib import Path
+import random
+import sys
+
+import yaml
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from codegen.devices import DEVICES
+
+ROOMS = {
+    'living': 'Living room',
+    'kitchen': 'Kitchen',
+    'bedroom': 'Bedroom',
+    'bathroom': 'Bathroom',
+    'office': 'Office',
+}
+
+
+def get_device_types():
+    """
+        All device types names from registry
+    """
+    return sorted(
+        name for name, value in vars(DEVICES).items()
+        if name.isupper() and isinstance(value, dict) and 'types' in value
+    )
+
+
+def make_channel(idx: int, channel_id: str, rnd: random.Random) -> dict:
+    channel = {
+        'id': f'dev{idx}_{channel_id.lower()}',
+        'name': f'Device {idx} {channel_id}',
+    }
+    if rnd.random() < 0.3:
+        channel['expire'] = '1h'
+    if rnd.random() < 0.5:
+        channel['groups'] = {'sw': ['g_light_all'], 'cmd': ['g_blinds_all']}
+    if rnd.random() < 0.2:
+        channel['y2m'] = {'room': rnd.choice(list(ROOMS)), 'name': f'Channel {idx} {channel_id}'}
+    return channel
+
+
+def make_device(idx: int, type_id: str, rnd: random.Random) -> dict:
+    """
+        Device config entry (as in conf/*.yaml) for given type
+    """
+    type_config = getattr(DEVICES, type_id)
+    tags = type_config['types']
+    device = {
+        'type': type_id,
+        'id': f'dev{idx}_{type_id.lower()}',
+        'name': f'Device {idx} {type_id}',
+    }
+    if 'zigbee' in tags:
+        device['zigbee_id'] = f'0x{0xa000000000000000 + idx:016x}'
+    if 'petrows' in tags:
+        device['device_id'] = ':'.join(f'{(idx >> s) & 0xff:02X}' for s in (40, 32, 24, 16, 8, 0))
+    if 'tasmota' in tags:
+        device['channels'] = {
+            ch['id']: make_channel(idx, ch['id'], rnd)
+            for ch in type_config.get('tasmota_channels', [])
+        }
+    if 'plug_mt' in tags or 'blinds_mt' in tags:
+        device['channels'] = {
+            f'l{n}': make_channel(idx, f'l{n}', rnd)
+            for n in (1, 2)
+        }
+    if rnd.random() < 0.3:
+        device['groups'] = {'sw': ['g_light_all'], 'dim': ['g_dim_all'], 'ct': ['g_ct_all']}
+    if rnd.random() < 0.2:
+        device['expire'] = '30m'
+    if rnd.random() < 0.1:
+        device['icon'] = 'light'
+    if rnd.random() < 0.2:
+        device['y2m'] = {'room': rnd.choice(list(ROOMS)), 'name': f'Device {idx}'}
+    return device
+
+
+def generate_fleet(path: Path, devices: int, configs: int = 1, seed: int = 1):
+    """
+        Write synthetic fleet to path, devices are evenly split on configs
+    """
+    rnd = random.Random(seed)
+    types = get_device_types()
+    configs_devices = [list() for _ in range(configs)]
+    for idx in range(devices):
+        configs_devices[idx % configs].append(make_device(idx, types[idx % len(types)], rnd))
+
+    (path / 'conf').mkdir(parents=True, exist_ok=True)
+    for config_idx, config_devices in enumerate(configs_devices):
+        config = {
+            'config': {'mqtt_broker_id': f'broker{config_idx}'},
+            'devices': config_devices,
+        }
+        with open(path / 'conf' / f'site{config_idx}.yaml', 'w') as f:
+            yaml.safe_dump(config, f, allow_unicode=True, sort_keys=False)
+    with open(path / 'y2m.yaml', 'w') as f:
+        yaml.safe_dump({'y2m': {'rooms': ROOMS}}, f, allow_unicode=True, sort_keys=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Generate synthetic devices fleet')
+    parser.add_argument(
+        'config_path',
+        type=Path,
+        help='Output folder (conf/*.yaml and y2m.yaml are created)',
+    )
+    parser.add_argument(
+        '--devices',
+        type=int,
+        default=1000,
+        help='Number of devices',
+    )
+    parser.add_argument(
+        '--configs',
+        type=int,
+        default=1,
+        help='Number of config files',
+    )
+    parser.add_argument(
+        '--seed',
+        type=int,
+        default=1,
+        help='Random seed',
+    )
+
+    args = parser.parse_args()
+
+    generate_fleet(args.config_path, args.devices, args.configs, args.seed)
@@ -7,9 +7,8 @@
 from codegen import codegen
 import os
 import logging
+import sys
 import argparse
-import numpy as np
-import yaml
 from pathlib import Path
 
 logging.basicConfig(level=logging.DEBUG)
@@ -32,25 +31,121 @@ if __name__ == "__main__":
     parser.add_argument(
         'config_path',
         type=Path,
+        nargs='?',
         help='Devices configs folder for codegen, should contain /conf and /devices folders to traverse',
     )
     parser.add_argument(
         'openhab_path',
         type=Path,
+        nargs='?',
         help='Path to openhab userdata (has items, rules, things, ... folders)',
     )
+    parser.add_argument(
+        '--target',
+        type=Path,
+        nargs=2,
+        action='append',
+        default=[],
+        metavar=('CONFIG_PATH', 'OPENHAB_PATH'),
+        help='Additional target (batch mode): parsed files, device types and rendered devices are shared by targets',
+    )
     parser.add_argument(
         '--write',
         action='store_true',
         help='Write config files to FS',
     )
+    parser.add_argument(
+        '--cache',
+        type=Path,
+        default=None,
+        help='Cache file for rendered devices, unchanged devices are not rendered again',
+    )
+    parser.add_argument(
+        '--jobs', '-j',
+        type=int,
+        default=1,
+        help='Number of processes to render devices',
+    )
+    parser.add_argument(
+        '--shard',
+        default=None,
+        help='Split things, items and rules files: config (per config file), '
+             'room (per y2m room), hash:N (N buckets by device id)',
+    )
+    parser.add_argument(
+        '--stats',
+        type=Path,
+        nargs='?',
+        const=Path('-'),
+        default=None,
+        help='Report time of stages and generated objects counters: table and JSON to stderr, '
+             'or JSON to given file',
+    )
+    parser.add_argument(
+        '--transform-link',
+        choices=['copy', 'hardlink', 'reflink'],
+        default='copy',
+        help='Deploy transforms as copies, hardlinks or reflinks (copy-on-write clones)',
+    )
+    parser.add_argument(
+        '--report',
+        choices=['json', 'summary'],
+        default=None,
+        help='Print report of changed files (lines, devices and items counters) instead of diff',
+    )
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        help='Read and render devices one by one, keep rendered devices on disk (bounded memory)',
+    )
+    parser.add_argument(
+        '--watch',
+        action='store_true',
+        help='Keep running and regenerate on config change',
+    )
 
     args = parser.parse_args()
 
+    from codegen.templates import enable_bytecode_cache
+    enable_bytecode_cache()
+
+    if (args.config_path is None) != (args.openhab_path is None):
+        parser.error('both config_path and openhab_path are required')
+    targets = [(args.config_path, args.openhab_path)] if args.config_path else []
+    targets += [tuple(target) for target in args.target]
+    if not targets:
+        parser.error('config_path and openhab_path (or --target) are required')
+
+    if args.target:
+        if args.watch or args.stream:
+            parser.error('--watch and --stream can\'t be used with --target')
+        from codegen.batch import run_batch
+        run_batch(
+            targets,
+            write=args.write,
+            cache_path=args.cache,
+            jobs=args.jobs,
+            shard=args.shard,
+            stats_file=args.stats,
+            transform_link=args.transform_link,
+            report=args.report,
+        )
+        sys.exit(0)
+
     codegen = codegen.codegen(
         write=args.write,
         openhab_path=args.openhab_path,
+        cache_path=args.cache,
+        jobs=args.jobs,
+        shard=args.shard,
+        stats_file=args.stats,
+        transform_link=args.transform_link,
+        report=args.report,
+        stream=args.stream,
     )
     codegen.load_config_yaml(args.config_path)
     logging.info("Loaded config from %s", args.config_path)
-    codegen.run()
+    if args.watch:
+        codegen.watch()
+    else:
+        codegen.run()
@@ -1,3 +1,3 @@
 #!/usr/bin/env python3
 
-__all__ = ["codegen", "devices"]
+__all__ = ["api", "batch", "codegen", "devices"]
@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+"""
+    Library API: generate openHAB configs in memory from parsed configs
+"""
+
+from typing import Dict, Optional
+
+from .codegen import codegen
+
+
+def generate(
+        configs: Dict[str, Dict],
+        y2m: Optional[Dict] = None,
+        shard: Optional[str] = None,
+        jobs: int = 1,
+    ) -> Dict[str, str]:
+    """
+        Generate all files: config ID -> parsed conf/<ID>.yaml, y2m is parsed y2m.yaml.
+        Result is relative path -> content (see codegen.get_files()).
+        Nothing is written and printed, each call has own state:
+        calls may run concurrently (e.g. one thread per site)
+    """
+    generator = codegen(jobs=jobs, shard=shard)
+    generator.load_configs(configs, y2m)
+    generator.prepare_devices()
+    return generator.get_files()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+    Batch mode: several targets (config path, openHAB path) in one process
+"""
+
+import json
+import logging
+from pathlib import Path
+import sys
+from typing import Dict, List, Tuple
+
+from .cache import ConfigCache, FragmentCache, codegen_fingerprint
+from .codegen import codegen
+from .stats import Stats
+
+
+def run_batch(
+        targets: List[Tuple[Path, Path]],
+        write=False,
+        cache_path: Path = None,
+        jobs: int = 1,
+        shard: str = None,
+        stats_file: Path = None,
+        transform_link: str = 'copy',
+        report: str = None,
+    ) -> None:
+    """
+        Generate configs for all targets. Type registry, templates, parsed files
+        (same content is parsed once) and rendered devices are shared:
+        devices of all targets are rendered together (on process pool, if jobs > 1),
+        same device with same global config is rendered once.
+        Nothing is written, if identifiers conflict in any target.
+        Targets with unchanged inputs and outputs (see manifest) are skipped
+    """
+    generators = [
+        codegen(
+            write=write,
+            openhab_path=openhab_path,
+            jobs=jobs,
+            shard=shard,
+            transform_link=transform_link,
+            report=report,
+        )
+        for _, openhab_path in targets
+    ]
+    first = generators[0]
+
+    # Shared state: caches are saved once, after all targets are processed
+    cache = FragmentCache(cache_path)
+    config_cache = ConfigCache(cache_path.with_name(cache_path.name + '.configs') if cache_path else None)
+    fingerprint = codegen_fingerprint(first.self_path)
+    parsed: Dict = dict()
+    stats = Stats()
+    for generator in generators:
+        generator.device_registry = first.device_registry
+        generator.cache = cache
+        generator.config_cache = config_cache
+        generator.fingerprint = fingerprint
+        generator.parsed = parsed
+        generator.stats = stats
+        generator.save_caches = False
+
+    for generator, (config_path, _) in zip(generators, targets):
+        generator.load_config_yaml(config_path)
+        logging.info("Loaded config from %s", config_path)
+    config_cache.save()
+    active = [generator for generator in generators if not generator.up_to_date]
+
+    with stats.stage('prepare_devices'):
+        queues = [generator.queue_devices() for generator in active]
+        # Devices to render: same cache key - same render
+        unique = dict()
+        for generator, queue in zip(active, queues):
+            for config, idx, key in queue:
+                unique.setdefault(key, config['devices_obj'][idx])
+        logging.info("Rendering %d unique devices for %d targets", len(unique), len(active))
+        with stats.stage('render_devices'):
+            rendered = dict(zip(unique.keys(), first.render_devices(list(unique.values()))))
+        for generator, queue in zip(active, queues):
+            generator.set_renders(queue, [rendered[key] for _, _, key in queue])
+        with stats.stage('cache_save'):
+            cache.save()
+        for generator in active:
+            generator.check_collisions()
+
+    with stats.stage('update_all'):
+        for generator in active:
+            generator.update_all()
+
+    if report:
+        print_batch_report(report, [
+            (openhab_path, generator.get_report())
+            for generator, (_, openhab_path) in zip(generators, targets)
+        ])
+
+    if stats_file:
+        for generator in generators[:-1]:
+            generator.count_stats()
+        generators[-1].stats_file = stats_file
+        generators[-1].report_stats()
+
+
+def print_batch_report(report_mode: str, reports: List[Tuple[Path, Dict]]) -> None:
+    """
+        Print reports of all targets to stdout, JSON or summary
+    """
+    if report_mode == 'json':
+        report = {
+            'changed': any(target_report['changed'] for _, target_report in reports),
+            'targets': [
+                {'openhab_path': str(openhab_path)} | target_report
+                for openhab_path, target_report in reports
+            ],
+        }
+        sys.stdout.write(json.dumps(report, indent=2) + '\n')
+    else:
+        for openhab_path, target_report in reports:
+            sys.stdout.write(f"{openhab_path}:\n")
+            sys.stdout.writelines(line + '\n' for line in codegen.get_report_summary(target_report))
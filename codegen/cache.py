@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+    Persistent cache of rendered device fragments
+"""
+
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from codegen.device import DeviceRender
+
+
+def codegen_fingerprint(self_path: Path) -> str:
+    """
+        Hash of codegen sources and rule templates.
+        Any change in generator code invalidates all cached fragments.
+    """
+    h = hashlib.sha256()
+    sources = sorted(self_path.glob('codegen/*.py')) + sorted(self_path.glob('rules/*.rules'))
+    for source in sources:
+        h.update(source.name.encode())
+        h.update(source.read_bytes())
+    return h.hexdigest()
+
+
+def fragment_key(device_config, type_config, global_config, fingerprint: str) -> str:
+    """
+        Cache key for one device: depends on device YAML entry,
+        device type from DEVICES, merged global config and codegen version
+    """
+    data = json.dumps(
+        [device_config, type_config, global_config, fingerprint],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+class FragmentCache:
+    """
+        Storage for rendered device fragments (things, items, rules, ...).
+        Stored as single JSON file (or in memory only, if file is None),
+        entries not used in last run are dropped on save.
+    """
+
+    def __init__(self, file: Optional[Path]) -> None:
+        self.file = file
+        self.entries: Dict[str, Any] = {}
+        self.used: Dict[str, Any] = {}
+        self.hits = 0
+        self.misses = 0
+        if not file:
+            return
+        try:
+            with open(file, 'r') as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            logging.info("Cache %s does not exist, will be created", str(file))
+        except ValueError:
+            logging.warning("Cache %s is broken, ignoring", str(file))
+
+    def get(self, key: str) -> DeviceRender:
+        render = self.entries.get(key, None)
+        if render is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.used[key] = render
+        return DeviceRender.from_dict(render)
+
+    def put(self, key: str, render: DeviceRender) -> None:
+        self.used[key] = render._asdict()
+
+    def keep(self, key: str) -> None:
+        """
+            Keep entry of render taken not from cache (e.g. from last run in watch mode)
+        """
+        if key in self.entries:
+            self.used[key] = self.entries[key]
+
+    def save(self) -> None:
+        """
+            Store entries used in this run, cache is ready for next run
+        """
+        logging.info("Cache: %d hits, %d misses", self.hits, self.misses)
+        # Keys are content hashes: same keys means same content
+        changed = self.used.keys() != self.entries.keys()
+        self.entries = self.used
+        self.used = {}
+        self.hits = 0
+        self.misses = 0
+        if not self.file or not changed:
+            return
+        self.file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.file.with_name(self.file.name + '.tmp')
+        with open(tmp_file, 'w') as f:
+            json.dump(self.entries, f, ensure_ascii=False)
+        os.replace(tmp_file, self.file)
+
+
+class ConfigCache:
+    """
+        Storage for parsed config files.
+        Entry is valid while file has same size and mtime (or same content hash),
+        all entries are dropped when version (codegen and config defaults) is changed.
+        Stored as single pickle file (or in memory only, if file is None),
+        entries not used in last run are dropped on save.
+    """
+
+    def __init__(self, file: Optional[Path]) -> None:
+        self.file = file
+        self.version = None
+        self.entries: Dict[str, Dict] = {}
+        self.used: Dict[str, Dict] = {}
+        self.changed = False
+        if not file:
+            return
+        # Pickle is imported only if cache file is used
+        import pickle
+        try:
+            with open(file, 'rb') as f:
+                data = pickle.load(f)
+            self.version = data['version']
+            self.entries = data['entries']
+        except FileNotFoundError:
+            logging.info("Config cache %s does not exist, will be created", str(file))
+        except Exception:
+            logging.warning("Config cache %s is broken, ignoring", str(file))
+
+    def set_version(self, version: str) -> None:
+        if version != self.version:
+            if self.entries:
+                logging.info("Config cache: version is changed, dropping %d entries", len(self.entries))
+            self.version = version
+            self.entries = {}
+            self.used = {}
+            self.changed = True
+
+    def get(self, file: Path, st: os.stat_result) -> Tuple[bool, Any]:
+        """
+            Cached data of file: (found, data)
+        """
+        entry = self.used.get(str(file), None) or self.entries.get(str(file), None)
+        if entry is None or entry['size'] != st.st_size:
+            return False, None
+        if entry['mtime_ns'] != st.st_mtime_ns:
+            # Touched, but may be not changed
+            if hashlib.sha256(file.read_bytes()).hexdigest() != entry['sha256']:
+                return False, None
+            entry = entry | {'mtime_ns': st.st_mtime_ns}
+            self.changed = True
+        self.used[str(file)] = entry
+        return True, entry['data']
+
+    def put(self, file: Path, st: os.stat_result, sha256: str, data: Any) -> None:
+        self.used[str(file)] = {
+            'mtime_ns': st.st_mtime_ns,
+            'size': st.st_size,
+            'sha256': sha256,
+            'data': data,
+        }
+        self.changed = True
+
+    def save(self) -> None:
+        """
+            Store entries used in this run, cache is ready for next run
+        """
+        changed = self.changed or self.used.keys() != self.entries.keys()
+        self.entries = self.used
+        self.used = {}
+        self.changed = False
+        if not self.file or not changed:
+            return
+        self.file.parent.mkdir(parents=True, exist_ok=True)
+        import pickle
+        tmp_file = self.file.with_name(self.file.name + '.tmp')
+        with open(tmp_file, 'wb') as f:
+            pickle.dump({'version': self.version, 'entries': self.entries}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, self.file)
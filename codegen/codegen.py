@@ -4,20 +4,25 @@
 """
 
 
-from difflib import context_diff, ndiff, unified_diff
+import hashlib
+import json
 import logging
+import math
+import os
 from pathlib import Path
-from pprint import pp
 import sys
-from typing import List
+import tempfile
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
-import numpy as np
-from codegen import thing
-from codegen.device import Device
-
-from codegen.thing import Thing
+from codegen.device import Device, DeviceRender, get_rules_batch
 from . import devices
-import yaml
+from .collisions import CollisionIndex, Owner
+from .cache import ConfigCache, FragmentCache, codegen_fingerprint, fragment_key
+from .manifest import MANIFEST_FILE, Manifest
+from .stats import Stats
+from .shard import get_device_shard, parse_shard_mode
+from . import yamlio
 
 PREAMBULA = """
 // ==========================================
@@ -29,6 +34,112 @@ PREAMBULA = """
 
 """.split('\n')
 
+
+# Transforms for hand-written items and rules (not referenced by generated ones), always deployed
+ALWAYS_DEPLOYED_TRANSFORMS = frozenset([
+    'codegen-cmd-color_temp-startup.js',
+    'codegen-permit-join.js',
+])
+
+# Linux ioctl: clone file extents (reflink)
+FICLONE = 0x40049409
+
+TRANSFORM_LINK_MODES = ['copy', 'hardlink', 'reflink']
+
+# Change report instead of diff: JSON or human-readable summary
+REPORT_MODES = ['json', 'summary']
+
+# Generated files, relative to openHAB path
+THINGS_FILE = Path('things/gen_things.things')
+ITEMS_FILE = Path('items/gen_items.items')
+RULES_FILE = Path('rules/gen_auto.rules')
+SITEMAP_FILE = Path('sitemaps/gen.sitemap')
+TRANSFORM_DIR = Path('transform')
+Y2M_JS_FILE = Path('yandex2mqtt.codegen.js')
+Y2M_TEMPLATE_FILE = Path('yandex2mqtt.template.js')
+
+# Zigbee devices configs, relative to config path
+DEVICES_YAML_DIR = Path('devices')
+
+
+def get_umask() -> int:
+    """
+        Current process umask (to create files with default permissions)
+    """
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+def link_file(src: Path, dst: Path, mode: str):
+    """
+        Replace dst atomically by hardlink or reflink (copy-on-write clone) of src.
+        Falls back to copy, if link is not supported by filesystem
+    """
+    tmp = dst.with_name(f'.{dst.name}.{os.getpid()}.tmp')
+    try:
+        try:
+            if mode == 'hardlink':
+                os.link(src, tmp)
+            elif mode == 'reflink':
+                import fcntl
+                with open(src, 'rb') as fsrc, open(tmp, 'wb') as fdst:
+                    fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            else:
+                raise OSError(f"Link mode {mode} is not supported")
+        except OSError as e:
+            logging.debug("Can't %s %s: %s, copying", mode, str(src), e)
+            tmp.unlink(missing_ok=True)
+            import shutil
+            shutil.copyfile(src, tmp)
+        if mode != 'hardlink':
+            os.chmod(tmp, 0o666 & ~get_umask())
+        os.replace(tmp, dst)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def is_same_file(src: Path, dst: Path) -> bool:
+    """
+        Files are linked or have same content
+    """
+    return os.path.samefile(src, dst) or (
+        dst.stat().st_size == src.stat().st_size and dst.read_bytes() == src.read_bytes())
+
+
+def parse_yaml(content: bytes) -> Any:
+    """
+        Parse YAML file content (process pool entry point)
+    """
+    return yamlio.load(content)
+
+
+def render_chunk(devices_list: List[Device]) -> List[DeviceRender]:
+    """
+        Render devices chunk (process pool entry point)
+    """
+    rules = get_rules_batch(devices_list)
+    return [
+        device.render(rules_header=rules_header, rules=device_rules)
+        for device, (rules_header, device_rules) in zip(devices_list, rules)
+    ]
+
+
+# Type registry of worker process (streaming mode)
+_worker_registry = None
+
+
+def render_config_chunk(devices_configs: List[Dict], global_config: Dict) -> List[DeviceRender]:
+    """
+        Create devices from their configs and render them (process pool entry point).
+        Only configs are sent to worker, device types are taken from worker's own registry
+    """
+    global _worker_registry
+    if _worker_registry is None:
+        _worker_registry = devices.DEVICES()
+    return render_chunk([_worker_registry.get_device(device, global_config) for device in devices_configs])
+
+
 class codegen:
     """
         Main application class
@@ -46,152 +157,655 @@ class codegen:
             self,
             write=False,
             openhab_path:Path=None,
+            cache_path:Path=None,
+            jobs:int=1,
+            shard:str=None,
+            stats_file:Path=None,
+            transform_link:str='copy',
+            report:str=None,
+            stream:bool=False,
         ) -> None:
         self.write = write
         self.self_path = Path(__file__).parent.parent
         self.openhab_path = openhab_path
+        self.config_path = None
+        self.jobs = jobs
+        # Split things, items and rules files
+        self.shard_mode, self.shard_buckets = parse_shard_mode(shard)
+        # Streaming: devices are read and rendered one by one, renders are spilled to disk
+        self.stream = stream
+        if stream and (self.shard_mode or cache_path):
+            raise ValueError("Streaming mode can't be used with shards or cache")
         self.configs = list()
+        # Type registry is same for all runs
+        self.device_registry = devices.DEVICES()
+        # Rendered devices cache (persistent, if file is set)
+        self.cache = FragmentCache(cache_path) if cache_path else None
+        self.fingerprint = None
+        # Parsed config files (persistent near rendered devices cache, if it is set)
+        self.config_cache = ConfigCache(
+            cache_path.with_name(cache_path.name + '.configs') if cache_path else None)
+        # Parsed YAML by content hash, shared by targets in batch mode (see batch.py)
+        self.parsed: Optional[Dict[str, Any]] = None
+        # Parsed devices of config files by their YAML text (watch mode): only changed devices are parsed again
+        self.parsed_items: Optional[Dict[Path, Dict[str, Any]]] = None
+        # Caches are saved after use (batch mode saves shared caches itself)
+        self.save_caches = True
+        self.collisions = None
+        # Devices of last run are reused, if their configs are not changed (watch mode)
+        self.reuse_devices = False
+        self.prepared_configs: List[Dict] = list()
+        # Generated files of last run (watch mode): file -> (source, size, mtime, hash),
+        # file is not generated again, if its source (renders) and stat are not changed
+        self.written: Dict[Path, Tuple[Any, int, int, Optional[str]]] = dict()
+        # Time of stages and counters, reported if stats file is set ('-' for stderr)
+        self.stats = Stats()
+        self.stats_file = stats_file
+        # How transforms are deployed: copy, hardlink or reflink
+        if transform_link not in TRANSFORM_LINK_MODES:
+            raise ValueError(
+                f"Unknown transform link mode {transform_link}, expected one of: {', '.join(TRANSFORM_LINK_MODES)}")
+        self.transform_link = transform_link
+        # Report of changed files (diff is not displayed then)
+        if report and report not in REPORT_MODES:
+            raise ValueError(f"Unknown report mode {report}, expected one of: {', '.join(REPORT_MODES)}")
+        self.report_mode = report
+        self.report_files: List[Dict] = list()
+        # Inputs and outputs of last run (in openHAB path), run is skipped if nothing is changed
+        self.manifest: Optional[Manifest] = None
+        self.up_to_date = False
         pass
 
+    def get_config_version(self) -> str:
+        """
+            Version of parsed config objects: codegen version and config defaults
+        """
+        if not self.fingerprint:
+            self.fingerprint = codegen_fingerprint(self.self_path)
+        data = json.dumps([self.fingerprint, self.config_defaults], sort_keys=True, default=str)
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    def build_config(self, file: Path, data) -> Dict:
+        """
+            Config object from parsed YAML file (stored in config cache)
+        """
+        if file.name == 'y2m.yaml' and file.parent == self.config_path:
+            return {'y2m': data.get('y2m', {'rooms':{}})}
+        return {
+            'config': self.config_defaults | data['config'],
+            'devices': data.get('devices', []),
+        }
+
+    def read_config_files(self, files: List[Path]) -> List[Dict]:
+        """
+            Config objects of files (same order), only files changed since
+            last read (or since last run, if cache file is set) are parsed.
+            If jobs > 1, changed files are parsed on process pool.
+            Files with same content are parsed once
+        """
+        cache = self.config_cache
+        cache.set_version(self.get_config_version())
+        stats = [file.stat() for file in files]
+        result = list()
+        changed = list()
+        for file, st in zip(files, stats):
+            found, data = cache.get(file, st)
+            if not found:
+                logging.info("Reading config from %s", str(file))
+                changed.append((file, st))
+            result.append(data)
+        if changed:
+            parsed = self.parsed if self.parsed is not None else dict()
+            contents = [file.read_bytes() for file, _ in changed]
+            hashes = [hashlib.sha256(content).hexdigest() for content in contents]
+            queue = dict()
+            for (file, _), sha256, content in zip(changed, hashes, contents):
+                if sha256 not in parsed:
+                    queue[sha256] = (file, content)
+            with self.stats.stage('yaml_parse'):
+                if self.parsed_items is not None:
+                    parsed.update(
+                        (sha256, yamlio.load_by_items(content, 'devices', self.parsed_items.setdefault(file, dict())))
+                        for sha256, (file, content) in queue.items())
+                elif self.jobs <= 1 or len(queue) < 2:
+                    parsed.update((sha256, parse_yaml(content)) for sha256, (_, content) in queue.items())
+                else:
+                    from concurrent.futures import ProcessPoolExecutor
+                    with ProcessPoolExecutor(max_workers=min(self.jobs, len(queue))) as executor:
+                        parsed.update(zip(queue.keys(), executor.map(
+                            parse_yaml, (content for _, content in queue.values()))))
+            for (file, st), sha256 in zip(changed, hashes):
+                cache.put(file, st, sha256, self.build_config(file, parsed[sha256]))
+            result = [cache.get(file, st)[1] for file, st in zip(files, stats)]
+        return result
+
+    def read_config_stream(self, file: Path) -> Dict:
+        """
+            Config object without devices (streaming mode)
+        """
+        logging.info("Reading config from %s", str(file))
+        with self.stats.stage('yaml_parse'):
+            config = yamlio.load_key(file, 'config')
+        if config is None:
+            raise RuntimeError(f"Config {file}: 'config' section is not found")
+        return {
+            'config': self.config_defaults | config,
+            'devices': [],
+        }
+
+    def get_input_files(self, config_path: Path) -> List[Path]:
+        """
+            Files generated output depends on: configs, codegen sources
+            (with CLI, which sets options and paths), rule templates,
+            transforms and yandex2mqtt template
+        """
+        files = sorted(config_path.glob('conf/*.yaml')) + [config_path / 'y2m.yaml']
+        for pattern in ['codegen.py', 'codegen/*.py', 'rules/*.rules', 'transform/*', 'y2m/yandex2mqtt.template.js']:
+            files += sorted(self.self_path.glob(pattern))
+        return files
+
+    def get_options(self) -> Dict:
+        """
+            Options generated output depends on
+        """
+        return {
+            'shard': [self.shard_mode, self.shard_buckets],
+            'transform_link': self.transform_link,
+            'config_defaults': self.config_defaults,
+        }
+
+    def check_manifest(self, config_path: Path) -> bool:
+        """
+            Check inputs and outputs against manifest of last run
+        """
+        self.manifest = Manifest(self.openhab_path / MANIFEST_FILE)
+        self.manifest.set_inputs(self.get_input_files(config_path), self.get_options())
+        self.up_to_date = self.manifest.is_up_to_date()
+        return self.up_to_date
+
     def load_config_yaml(self, config_path: Path):
         """
             Load config defines from YAML format
-            from <path>/conf/*.yaml
-        """
-        self.config_path = config_path
-        confgis_list = config_path.glob('conf/*.yaml')
-        for config_file in confgis_list:
-            with open(config_file, "r") as stream:
-                logging.info("Reading config from %s", str(config_file))
-                config_yaml = yaml.safe_load(stream)
-                config_obj = {
-                    'id': config_file.stem,
-                    'file': config_file,
-                    'config': self.config_defaults | config_yaml['config'],
-                    'devices': config_yaml.get('devices', []),
-                    'devices_obj': list(),
-                }
-                self.configs.append(config_obj)
-        with open(config_path / 'y2m.yaml', "r") as stream:
-            config_yaml = yaml.safe_load(stream)
-            self.config_y2m = config_yaml.get('y2m', {'rooms':{}})
-
-    def write_file(self, data, file=Path):
-        # Join data file to strings + trailing \n
-        things_conf = '\n'.join(data) + '\n'
+            from <path>/conf/*.yaml.
+            Nothing is loaded, if inputs and outputs are not changed since last run
+        """
+        with self.stats.stage('load'):
+            self.config_path = config_path
+            self.configs = list()
+            if self.openhab_path and self.check_manifest(config_path):
+                logging.info("Inputs and outputs are not changed since last run, nothing to do")
+                self.config_y2m = {}
+                return
+            confgis_list = list(config_path.glob('conf/*.yaml'))
+            y2m_file = config_path / 'y2m.yaml'
+            if self.stream:
+                # Devices are read in prepare_devices_stream()
+                configs_data = [self.read_config_stream(file) for file in confgis_list]
+                configs_data += self.read_config_files([y2m_file])
+            else:
+                configs_data = self.read_config_files(confgis_list + [y2m_file])
+            for config_file, config_data in zip(confgis_list, configs_data):
+                self.add_config(config_file.stem, config_file, config_data)
+            self.config_y2m = configs_data[-1]['y2m']
+            if self.save_caches:
+                self.config_cache.save()
+
+    def load_configs(self, configs: Dict[str, Dict], y2m: Optional[Dict] = None):
+        """
+            Load already parsed configs: config ID -> content of conf/<ID>.yaml,
+            y2m is content of y2m.yaml (no yandex2mqtt config, if not set)
+        """
+        if self.stream:
+            raise ValueError("Streaming mode can't be used with parsed configs")
+        self.configs = list()
+        for config_id, data in configs.items():
+            config_file = Path('conf') / f'{config_id}.yaml'
+            self.add_config(config_id, config_file, self.build_config(config_file, data))
+        self.config_y2m = y2m.get('y2m', {'rooms':{}}) if y2m is not None else {}
+
+    def add_config(self, config_id: str, config_file: Path, config_data: Dict):
+        config_obj = {
+            'id': config_id,
+            'file': config_file,
+            'config': config_data['config'],
+            'devices': config_data['devices'],
+            'devices_obj': list(),
+            'renders': list(),
+            'shards': list(),
+            'keys': list(),
+        }
+        self.configs.append(config_obj)
+
+    def is_written(self, file: Path, source: Any) -> bool:
+        """
+            File was generated by last run from same source and is not changed since
+        """
+        written = self.written.get(file, None)
+        if written is None:
+            return False
+        try:
+            st = file.stat()
+        except FileNotFoundError:
+            return False
+        if (st.st_size, st.st_mtime_ns) != written[1:3] or written[0] != source:
+            return False
+        if self.manifest:
+            self.manifest.add_output(file, written[3])
+        return True
+
+    def set_written(self, file: Path, source: Any, sha256: Optional[str]):
+        if source is None or not self.reuse_devices:
+            return
+        st = file.stat()
+        self.written[file] = (source, st.st_size, st.st_mtime_ns, sha256)
+
+    def write_file(self, data: Iterable[str], file=Path, source: Any = None):
+        """
+            Write lines to file (without trailing \n), display diff with previous version.
+            Lines are consumed lazily and spooled to temporary file,
+            comparison with previous version is done line-by-line on the fly.
+            Unchanged file is not touched, changed file is replaced atomically.
+            In watch mode, file is skipped if its source (e.g. renders) is same as in last run
+        """
+        if source is not None and self.reuse_devices and self.is_written(file, source):
+            logging.debug("File %s is not changed", str(file))
+            return
+        self.written.pop(file, None)
         # We have previos version?
-        things_conf_old = list()
+        file_old = None
         try:
-            with open(file, 'r') as f:
-                things_conf_old = f.readlines()
+            file_old = open(file, 'r', newline='')
         except:
             logging.info("File %s does not exist, will be created", str(file))
             pass
-        # Disaply diff
-        if things_conf_old:
-            sys.stdout.writelines(
-                unified_diff(
-                    things_conf_old,
-                    # Emulate data read by readlines()
-                    [s + "\n" for s in data],
-                    fromfile=file.name,
-                    tofile=file.name,
-                )
-            )
         # Create directory
         file.parent.mkdir(parents=True, exist_ok=True)
-        # Write file...
+        # Temporary file is placed near target to be renamed to it
         if self.write:
-            with open(file, 'w') as f:
-                f.write(things_conf)
+            file_new = tempfile.NamedTemporaryFile(
+                'w+', newline='', dir=file.parent, prefix=f'.{file.name}.', delete=False)
+        else:
+            file_new = tempfile.TemporaryFile('w+', newline='')
+        try:
+            changed = file_old is None
+            sha256 = hashlib.sha256() if self.manifest else None
+            # Lines are written to file object of named temporary file (its wrapper is slow per call)
+            write = getattr(file_new, 'file', file_new).write
+            for line in data:
+                line = line + '\n'
+                write(line)
+                if sha256:
+                    sha256.update(line.encode(file_new.encoding))
+                if not changed and file_old.readline() != line:
+                    changed = True
+            if not changed and file_old.readline():
+                changed = True
+            digest = sha256.hexdigest() if sha256 else None
+            if sha256:
+                self.manifest.add_output(file, digest)
+            if not changed:
+                logging.debug("File %s is not changed", str(file))
+                self.set_written(file, source, digest)
+                return
+            # Report or disaply diff
+            if self.report_mode:
+                if file_old:
+                    file_old.seek(0)
+                file_new.seek(0)
+                with self.stats.stage('diff'):
+                    self.add_report(file, file_old.readlines() if file_old else None, file_new.readlines())
+            elif file_old:
+                file_old.seek(0)
+                file_new.seek(0)
+                with self.stats.stage('diff'):
+                    from .diff import BlockDiff
+                    diff = BlockDiff(file_old.readlines(), file_new.readlines())
+                    logging.info(
+                        "File %s: %d added, %d removed, %d changed, %d moved devices",
+                        str(file), len(diff.added), len(diff.removed), len(diff.changed), len(diff.moved),
+                    )
+                    sys.stdout.writelines(diff.unified(fromfile=file.name, tofile=file.name))
+            # Write file...
+            if self.write:
+                with self.stats.stage('write'):
+                    file_new.flush()
+                    os.fsync(file_new.fileno())
+                    file_new.close()
+                    if file_old:
+                        import shutil
+                        shutil.copymode(file, file_new.name)
+                    else:
+                        os.chmod(file_new.name, 0o666 & ~get_umask())
+                    os.replace(file_new.name, file)
+                self.set_written(file, source, digest)
+        finally:
+            if file_old:
+                file_old.close()
+            file_new.close()
+            if self.write and os.path.exists(file_new.name):
+                os.unlink(file_new.name)
 
+    def add_report(self, file: Path, old_lines: Optional[List[str]], new_lines: Optional[List[str]]):
+        """
+            Add changed file to report (if report is enabled)
+        """
+        if not self.report_mode:
+            return
+        from .diff import get_file_report
+        try:
+            name = str(file.relative_to(self.openhab_path))
+        except ValueError:
+            name = str(file)
+        self.report_files.append(
+            {'file': name} | get_file_report(old_lines, new_lines, items=file.suffix == '.items'))
 
-    def update_things(self, file=Path):
+    def add_report_removed(self, file: Path):
+        if self.report_mode:
+            with open(file, 'r', newline='') as f:
+                self.add_report(file, f.readlines(), None)
 
-        # Generate THINGS
-        conf_str: List[str] = list()
-        conf_str.extend(PREAMBULA)
-        for config in self.configs:
-            for device in config['devices_obj']:
-                things = device.get_things()
-                conf_str.extend(device.get_comment())
-                for thing in things:
-                    conf_str.extend(thing.get_config())
+    def remove_file(self, file: Path):
+        """
+            Remove generated file (report only, if not writing)
+        """
+        self.add_report_removed(file)
+        if self.manifest:
+            self.manifest.add_removed(file)
+        if self.write:
+            file.unlink()
 
-                logging.debug("Device: %s", device.get_label())
+    def get_report(self) -> Dict:
+        """
+            Report of changed files, collected entries are dropped
+        """
+        report = {
+            'changed': bool(self.report_files),
+            'files': self.report_files,
+        }
+        self.report_files = list()
+        return report
 
-        self.write_file(conf_str, file)
+    @staticmethod
+    def get_report_summary(report: Dict) -> List[str]:
+        lines = list()
+        for entry in report['files']:
+            line = (
+                f"{entry['status']} {entry['file']}: +{entry['lines_added']} -{entry['lines_removed']} lines, "
+                f"devices: {entry['devices_added']} added, {entry['devices_removed']} removed, "
+                f"{entry['devices_changed']} changed, {entry['devices_moved']} moved"
+            )
+            if entry['items']:
+                line += f", {len(entry['items'])} items"
+            lines.append(line)
+        lines.append(f"{len(report['files'])} files changed")
+        return lines
 
-    def update_items(self, file=Path):
+    def print_report(self):
+        """
+            Print report of changed files to stdout, JSON or summary
+        """
+        report = self.get_report()
+        if self.report_mode == 'json':
+            sys.stdout.write(json.dumps(report, indent=2) + '\n')
+        else:
+            sys.stdout.writelines(line + '\n' for line in self.get_report_summary(report))
 
-        # Generate ITEMS
-        conf_str: List[str] = list()
-        conf_str.extend(PREAMBULA)
+    def render_devices(self, devices_list: List[Device]) -> List[DeviceRender]:
+        """
+            Render devices list, result has same order.
+            If jobs > 1, devices are rendered in chunks on process pool
+        """
+        if self.jobs <= 1 or len(devices_list) < 2:
+            return render_chunk(devices_list)
+
+        chunk_size = max(1, math.ceil(len(devices_list) / (self.jobs * 4)))
+        chunks = [
+            devices_list[i:i + chunk_size]
+            for i in range(0, len(devices_list), chunk_size)
+        ]
+        logging.info("Rendering %d devices on %d processes", len(devices_list), self.jobs)
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=self.jobs) as executor:
+            rendered = list()
+            for chunk_rendered in executor.map(render_chunk, chunks):
+                rendered.extend(chunk_rendered)
+        return rendered
+
+    def get_renders(self) -> Iterator[DeviceRender]:
+        """
+            All rendered devices, in config order
+        """
         for config in self.configs:
-            for device in config['devices_obj']:
-                items = device.get_items()
+            yield from config['renders']
+
+    def get_shards(self) -> Dict[str, List[DeviceRender]]:
+        """
+            Rendered devices grouped by shard name (sorted)
+        """
+        shards: Dict[str, List[DeviceRender]] = dict()
+        for config in self.configs:
+            for render, shard in zip(config['renders'], config['shards']):
+                shards.setdefault(shard, list()).append(render)
+        return dict(sorted(shards.items()))
+
+    def is_generated_file(self, file: Path) -> bool:
+        """
+            Check file has codegen preambula (is safe to be removed)
+        """
+        try:
+            with open(file, 'r') as f:
+                head = [f.readline().rstrip('\n') for _ in PREAMBULA]
+        except (OSError, UnicodeDecodeError):
+            return False
+        return head == PREAMBULA
+
+    def remove_stale(self, files: List[Path]):
+        """
+            Remove previously generated files, which are not generated anymore
+        """
+        for file in files:
+            if not self.is_generated_file(file):
+                continue
+            logging.info("File %s is not generated anymore, will be removed", str(file))
+            self.remove_file(file)
+
+    def iter_sharded(self, file: Path) -> Iterator[Tuple[Path, Tuple[DeviceRender, ...]]]:
+        """
+            Renders of file: all devices, or one file per shard: <name>_<shard>.<ext>
+        """
+        if not self.shard_mode:
+            yield file, tuple(self.get_renders())
+        else:
+            for shard, renders in self.get_shards().items():
+                yield file.with_name(f'{file.stem}_{shard}{file.suffix}'), tuple(renders)
+
+    def update_sharded(self, gen: Callable[[Iterable[DeviceRender]], Iterator[str]], file=Path):
+        """
+            Write file from all devices, or one file per shard:
+            <name>_<shard>.<ext>. Stale files are removed
+        """
+        produced = set()
+        for shard_file, renders in self.iter_sharded(file):
+            self.write_file(gen(renders), shard_file, source=renders)
+            produced.add(shard_file)
+        candidates = [file] + sorted(file.parent.glob(f'{file.stem}_*{file.suffix}'))
+        self.remove_stale([f for f in candidates if f not in produced and f.is_file()])
+
+    def gen_things(self, renders: Iterable[DeviceRender]) -> Iterator[str]:
+        # Generate THINGS
+        yield from PREAMBULA
+        for render in renders:
+            yield from render.things
+
+    def update_things(self, file=Path):
+        self.update_sharded(self.gen_things, file)
 
-                conf_str.extend(device.get_comment())
-                for item in items:
-                    conf_str.extend(item.get_config())
+    def gen_items(self, renders: Iterable[DeviceRender]) -> Iterator[str]:
+        # Generate ITEMS
+        yield from PREAMBULA
+        for render in renders:
+            yield from render.items
 
-        self.write_file(conf_str, file)
+    def update_items(self, file=Path):
+        self.update_sharded(self.gen_items, file)
 
     def update_transform(self, dir=Path):
-        transform_src = Path(self.self_path / "transform")
-        transform_files = transform_src.iterdir()
+        """
+            Deploy transforms, referenced by generated things and items.
+            Identical files are skipped. Unused codegen transforms are removed,
+            if they are same as shipped ones (older deployed versions are removed
+            by manifest, user files are kept)
+        """
+        transform_files = self.get_transform_files()
+        used = self.get_used_transforms()
 
         dir.mkdir(parents=True, exist_ok=True)
 
-        for f in transform_files:
-            self.write_file(open(f).read().splitlines(), dir / f.name)
+        for name in used:
+            if name not in transform_files:
+                # User-provided transform
+                logging.debug("Transform %s is not provided by codegen", name)
+                continue
+            self.deploy_transform(transform_files[name], dir / name)
 
-    def update_rules(self, file=Path):
-        # Generate rules list
-        conf_str: List[str] = list()
-        conf_str.extend(PREAMBULA)
-        for config in self.configs:
-            for device in config['devices_obj']:
-                conf_str.extend(device.get_rules_header())
-        conf_str.extend(['// ----------------------------'])
-        for config in self.configs:
-            for device in config['devices_obj']:
-                conf_str.extend(device.get_rules())
+        for file in sorted(dir.iterdir()):
+            if file.name in used or file.name not in transform_files:
+                continue
+            if file.is_symlink() or not file.is_file() or not is_same_file(transform_files[file.name], file):
+                logging.debug("Transform %s differs from shipped one, keeping it", str(file))
+                continue
+            logging.info("Transform %s is not used anymore, will be removed", str(file))
+            self.remove_file(file)
 
-        self.write_file(conf_str, file)
+    def get_transform_files(self) -> Dict[str, Path]:
+        """
+            Transforms provided by codegen
+        """
+        return {f.name: f for f in (self.self_path / "transform").iterdir()}
 
-    def update_gen_sitemap(self, file=Path):
+    def get_used_transforms(self) -> List[str]:
+        """
+            Transforms referenced by generated things and items,
+            and always deployed ones (sorted)
+        """
+        used = set(ALWAYS_DEPLOYED_TRANSFORMS)
+        for render in self.get_renders():
+            used.update(render.transforms)
+        return sorted(used)
+
+    def deploy_transform(self, src: Path, dst: Path):
+        """
+            Copy (or link) transform file, if target is not identical
+        """
+        if self.manifest:
+            self.manifest.add_output(dst)
+        try:
+            if is_same_file(src, dst):
+                logging.debug("File %s is not changed", str(dst))
+                return
+        except FileNotFoundError:
+            pass
+        if not self.write or self.transform_link == 'copy':
+            # Display diff (and write)
+            self.write_file(src.read_text().splitlines(), dst)
+            return
+        logging.info("Transform %s is changed, %s from %s", str(dst), self.transform_link, str(src))
+        if self.report_mode:
+            old_lines = None
+            if dst.exists():
+                with open(dst, 'r', newline='') as f:
+                    old_lines = f.readlines()
+            with open(src, 'r', newline='') as f:
+                self.add_report(dst, old_lines, f.readlines())
+        link_file(src, dst, self.transform_link)
+
+    def gen_rules(self, renders: Iterable[DeviceRender]) -> Iterator[str]:
         # Generate rules list
-        conf_str: List[str] = list()
-        conf_str.extend(PREAMBULA)
-        conf_str.extend(['sitemap gen label="GEN ITEMS"','{'])
+        # Header (global variables) must be in same file with rules,
+        # rules are spilled to temporary file while header is generated
+        yield from PREAMBULA
+        with tempfile.TemporaryFile('w+', newline='') as rules:
+            for render in renders:
+                yield from render.rules_header
+                rules.writelines(line + '\n' for line in render.rules)
+            yield '// ----------------------------'
+            rules.seek(0)
+            for line in rules:
+                yield line[:-1]
 
+    def update_rules(self, file=Path):
+        self.update_sharded(self.gen_rules, file)
+
+    def gen_sitemap(self) -> Iterator[str]:
+        # Generate sitemap
+        yield from PREAMBULA
+        yield 'sitemap gen label="GEN ITEMS"'
+        yield '{'
         for config in self.configs:
-            conf_str.extend([f'Text label="Z2M {config["id"]}" {{'])
-            for device in config['devices_obj']:
-                conf_str.extend([f'Frame label="{device.get_label()}" {{'])
-                items = device.get_items()
-                conf_str.extend(device.get_comment())
-                for item in items:
-                    conf_str.extend(item.get_sitemap_config())
-                conf_str.extend(['}'])
-            conf_str.extend(['}'])
+            yield f'Text label="Z2M {config["id"]}" {{'
+            for render in config['renders']:
+                yield from render.sitemap
+            yield '}'
+        yield '}'
 
-        conf_str.extend(['}'])
+    def update_gen_sitemap(self, file=Path):
+        source = tuple((config['id'], tuple(config['renders'])) for config in self.configs)
+        self.write_file(self.gen_sitemap(), file, source=source)
 
-        self.write_file(conf_str, file)
+    def gen_devices_yaml_stream(self, config) -> Iterator[str]:
+        """
+            devices.yaml from spooled renders (streaming mode):
+            each device is dumped separately, devices are sorted on disk
+        """
+        from .spool import SortedSpool
+
+        spool = SortedSpool()
+        try:
+            for render in config['renders']:
+                if render.zigbee_config:
+                    device_addr, device_conf = render.zigbee_config
+                    spool.add(device_addr, yamlio.dump({device_addr: device_conf}))
+            empty = True
+            for _, device_yaml in spool:
+                empty = False
+                yield from device_yaml.splitlines()
+            if empty:
+                yield from yamlio.dump({}).splitlines()
+        finally:
+            spool.close()
+
+    def gen_devices_yaml(self, config) -> Iterator[str]:
+        if self.stream:
+            yield from self.gen_devices_yaml_stream(config)
+            return
+        z2m_devices_conf = {}
+        for render in config['renders']:
+            if render.zigbee_config:
+                device_addr, device_conf = render.zigbee_config
+                z2m_devices_conf[device_addr] = device_conf
+        yield from yamlio.dump(z2m_devices_conf).splitlines()
 
     def update_devices_yaml(self, dir=Path):
         # Generate devices.yaml (per-instance)
         for config in self.configs:
-            z2m_devices_conf = {}
-            for device in config['devices_obj']:
-                if device.is_zigbee():
-                    device_conf = {}
-                    device_conf['friendly_name'] = device.get_id()
-                    device_conf = device_conf | device.get_zigbee_device_config()
-                    z2m_devices_conf[device.get_device_address()] = device_conf
-            self.write_file(yaml.dump(z2m_devices_conf).splitlines(), dir / f"{config['id']}.yaml")
+            self.write_file(
+                self.gen_devices_yaml(config), dir / f"{config['id']}.yaml", source=tuple(config['renders']))
+
+    def gen_y2m_js(self) -> Iterator[str]:
+        rooms = self.config_y2m['rooms']
+        # Include template
+        yield 'const tpl = require("./yandex2mqtt.template")'
+        yield 'const { LIGHT, LightGroup, Light, Thermostat, SensorClimate, SensorWindow, Shutter } = tpl'
+        yield 'const ROOMS = {'
+        for room_id, room in rooms.items():
+            yield f'  {room_id}: \'{room}\','
+        yield '}'
+        yield 'module.exports = {'
+        yield 'devices: ['
+        for render in self.get_renders():
+            yield from render.y2m
+        yield ']'
+        yield '}'
 
     def update_y2m_js(self, file=Path):
         # Generate yandex2mqtt
@@ -199,81 +813,407 @@ class codegen:
         if not self.config_y2m:
             return
         # Copy template
-        tpl_src = Path(self.self_path / "y2m/yandex2mqtt.template.js")
-        self.write_file(open(tpl_src).read().splitlines(), file.parent / "yandex2mqtt.template.js")
-        rooms = self.config_y2m['rooms']
+        self.write_file(self.gen_y2m_template(), file.parent / Y2M_TEMPLATE_FILE)
+        source = (tuple(self.config_y2m['rooms'].items()), tuple(self.get_renders()))
+        self.write_file(self.gen_y2m_js(), file, source=source)
 
-        conf_str: List[str] = list()
-        # Include template
-        conf_str.append('const tpl = require("./yandex2mqtt.template")')
-        conf_str.append('const { LIGHT, LightGroup, Light, Thermostat, SensorClimate, SensorWindow, Shutter } = tpl')
-        conf_str.append('const ROOMS = {')
-        for room_id, room in rooms.items():
-            conf_str.append(f'  {room_id}: \'{room}\',')
-        conf_str.append('}')
-        conf_str.append('module.exports = {')
-        conf_str.append('devices: [')
-        for config in self.configs:
-            for device in config['devices_obj']:
-                if device.has_y2m():
-                    conf_str.extend(device.get_y2m_config())
-        conf_str.append(']')
-        conf_str.append('}')
-        self.write_file(conf_str, file)
+    def gen_y2m_template(self) -> Iterator[str]:
+        tpl_src = Path(self.self_path / "y2m/yandex2mqtt.template.js")
+        yield from tpl_src.read_text().splitlines()
 
     def run(self):
         """
             Primary execute function
         """
+        if self.up_to_date:
+            if self.report_mode:
+                self.print_report()
+            if self.stats_file:
+                self.report_stats()
+            return
+        with self.stats.stage('prepare_devices'):
+            if self.stream:
+                self.prepare_devices_stream()
+            else:
+                self.prepare_devices()
+        with self.stats.stage('update_all'):
+            self.update_all()
+        if self.report_mode:
+            self.print_report()
+        if self.stats_file:
+            self.report_stats()
 
-        device_registry = devices.DEVICES()
+    def prepare_devices(self):
+        """
+            Create and validate devices, render them (or take from cache)
+        """
+        render_queue = self.queue_devices()
+
+        # Step 2: render devices, keeping original config order
+        with self.stats.stage('render_devices'):
+            rendered = self.render_devices([
+                config['devices_obj'][idx] for config, idx, _ in render_queue
+            ])
+        self.set_renders(render_queue, rendered)
+
+        if self.cache and self.save_caches:
+            with self.stats.stage('cache_save'):
+                self.cache.save()
+
+        self.check_collisions()
+
+    def queue_devices(self) -> List[Tuple[Dict, int, Optional[str]]]:
+        """
+            Create devices, take unchanged renders from cache.
+            Result is devices to be rendered: (config, device index, cache key)
+        """
+
+        device_registry = self.device_registry
+
+        cache = self.cache
+        if cache and not self.fingerprint:
+            self.fingerprint = codegen_fingerprint(self.self_path)
 
         # Step 1: find and validate devices ID and apply common values
         # map item property 'type' with proper value from DEVICES array
 
-        self.item_addresses = []
-        self.item_ids = []
+        self.collisions = CollisionIndex()
+        collisions = self.collisions
+
+        # Devices to be rendered (not found in cache)
+        render_queue = []
+
+        previous = self.get_previous_devices() if self.reuse_devices else dict()
+        self.prepared_configs = self.configs
 
         for config in self.configs:
+            config['devices_obj'] = list()
+            config['renders'] = list()
+            config['shards'] = list()
+            config['keys'] = list()
             for device in config['devices']:
+                # Unchanged device of last run
+                found = self.find_previous_device(previous, config, device) if previous else None
+                if found:
+                    old, idx = found
+                    device_obj = old['devices_obj'][idx]
+                    config['devices_obj'].append(device_obj)
+                    if self.shard_mode:
+                        config['shards'].append(old['shards'][idx])
+                    owner = Owner(str(config['file']), device_obj.get_id())
+                    collisions.add('address', device_obj.get_device_address(), owner)
+                    collisions.add('device', device_obj.get_id(), owner)
+                    key = old['keys'][idx]
+                    if cache and key:
+                        cache.keep(key)
+                    config['keys'].append(key)
+                    config['renders'].append(old['renders'][idx])
+                    continue
+
                 device_obj = device_registry.get_device(device, config['config'])
-                device_addr = device_obj.get_device_address()
-                device_id = device_obj.get_id()
                 config['devices_obj'].append(device_obj)
-                if device_addr in self.item_addresses:
-                    raise Exception(f"Device Address {device_addr} is not unique!")
-                self.item_addresses.append(device_addr)
-                if device_id in self.item_ids:
-                    raise Exception(f"Device ID {device_id} is not unique!")
-                self.item_ids.append(device_id)
+                if self.shard_mode:
+                    config['shards'].append(
+                        get_device_shard(self.shard_mode, self.shard_buckets, config['id'], device_obj))
+                owner = Owner(str(config['file']), device_obj.get_id())
+                collisions.add('address', device_obj.get_device_address(), owner)
+                collisions.add('device', device_obj.get_id(), owner)
+
+                # Take unchanged device render from cache
+                render = None
+                key = None
+                if cache:
+                    key = fragment_key(
+                        device,
+                        device_registry.get_from_id(id=device['type']),
+                        config['config'],
+                        self.fingerprint,
+                    )
+                    render = cache.get(key)
+                if render is None:
+                    render_queue.append((config, len(config['renders']), key))
+                config['keys'].append(key)
+                config['renders'].append(render)
 
             logging.info("Processing %d devices for %s", len(config['devices_obj']), config['id'])
 
-        self.update_things(
-            file=self.openhab_path / "things" / "gen_things.things",
-        )
+        return render_queue
+
+    def get_previous_devices(self) -> Dict[Tuple, List[Tuple[Dict, int]]]:
+        """
+            Rendered devices of last run: (config ID, device ID, type) -> [(config, device index)]
+        """
+        previous: Dict[Tuple, List[Tuple[Dict, int]]] = dict()
+        for config in self.prepared_configs:
+            if None in config['renders'] or len(config['renders']) != len(config['devices']):
+                # Not rendered (failed run)
+                continue
+            for idx, device in enumerate(config['devices']):
+                key = (config['id'], str(device.get('id')), device.get('type'))
+                previous.setdefault(key, list()).append((config, idx))
+        return previous
+
+    @staticmethod
+    def find_previous_device(previous: Dict[Tuple, List[Tuple[Dict, int]]], config: Dict,
+                             device: Dict) -> Optional[Tuple[Dict, int]]:
+        """
+            Same device (same config and global config) of last run, found one is not returned again
+        """
+        candidates = previous.get((config['id'], str(device.get('id')), device.get('type')), None)
+        if not candidates:
+            return None
+        for n, (old, idx) in enumerate(candidates):
+            old_device = old['devices'][idx]
+            if (old_device is device or old_device == device) and (
+                    old['config'] is config['config'] or old['config'] == config['config']):
+                return candidates.pop(n)
+        return None
+
+    def set_renders(self, render_queue: List[Tuple[Dict, int, Optional[str]]], rendered: List[DeviceRender]):
+        """
+            Place rendered devices (same order as queue) to configs and cache
+        """
+        for (config, idx, key), render in zip(render_queue, rendered):
+            config['renders'][idx] = render
+            if self.cache:
+                self.cache.put(key, render)
+
+    def check_collisions(self):
+        """
+            Check generated identifiers across all configs
+        """
+        # Step 3: check generated identifiers across all configs
+        collisions = self.collisions
+        for config in self.configs:
+            for device_obj, render in zip(config['devices_obj'], config['renders']):
+                owner = Owner(str(config['file']), device_obj.get_id())
+                for kind, uid in render.uids:
+                    collisions.add(kind, uid, owner)
+        self.collisions = None
+        if collisions.get_conflicts():
+            report = collisions.get_report()
+            raise Exception(f"Found {len(report)} identifiers conflicts:\n" + "\n".join(report))
+
+    def prepare_devices_stream(self, chunk_size: int = 256):
+        """
+            Read devices from config files one by one and render them in small chunks.
+            Renders are spilled to disk, device objects are not kept
+        """
+        from collections import deque
+        from .collisions import SpooledCollisionIndex
+        from .spool import RenderSpool
+
+        collisions = SpooledCollisionIndex()
 
-        self.update_items(
-            file=self.openhab_path / "items" / "gen_items.items",
-        )
+        # One process pool for whole stream, few chunks are rendered at once (bounded memory)
+        executor = None
+        if self.jobs > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            executor = ProcessPoolExecutor(max_workers=self.jobs)
+            logging.info("Rendering devices on %d processes", self.jobs)
+        pending = deque()
 
-        self.update_rules(
-            file=self.openhab_path / "rules" / "gen_auto.rules",
-        )
+        def add_renders(config, chunk, rendered):
+            for (device_obj, _), device_render in zip(chunk, rendered):
+                owner = Owner(str(config['file']), device_obj.get_id())
+                for kind, uid in device_render.uids:
+                    collisions.add(kind, uid, owner)
+                config['renders'].append(device_render)
 
-        self.update_gen_sitemap(
-            file=self.openhab_path / "sitemaps" / "gen.sitemap",
-        )
+        def collect(limit):
+            while len(pending) > limit:
+                config, chunk, future = pending.popleft()
+                with self.stats.stage('render_devices'):
+                    rendered = future.result()
+                add_renders(config, chunk, rendered)
 
-        self.update_transform(
-            dir=self.openhab_path / "transform",
-        )
+        def render(config, chunk):
+            if executor is None:
+                with self.stats.stage('render_devices'):
+                    rendered = render_chunk([device_obj for device_obj, _ in chunk])
+                add_renders(config, chunk, rendered)
+                return
+            pending.append((config, chunk, executor.submit(
+                render_config_chunk, [device for _, device in chunk], config['config'])))
+            collect(self.jobs * 2)
+
+        try:
+            for config in self.configs:
+                if isinstance(config['renders'], RenderSpool):
+                    config['renders'].close()
+                config['devices_obj'] = list()
+                config['renders'] = RenderSpool()
+                config['shards'] = list()
+                count = 0
+                chunk = list()
+                for device in yamlio.iter_key_items(config['file'], 'devices'):
+                    device_obj = self.device_registry.get_device(device, config['config'])
+                    owner = Owner(str(config['file']), device_obj.get_id())
+                    collisions.add('address', device_obj.get_device_address(), owner)
+                    collisions.add('device', device_obj.get_id(), owner)
+                    chunk.append((device_obj, device))
+                    count += 1
+                    if len(chunk) >= chunk_size:
+                        render(config, chunk)
+                        chunk = list()
+                if chunk:
+                    render(config, chunk)
+                logging.info("Processing %d devices for %s", count, config['id'])
+            collect(0)
+        finally:
+            if executor:
+                executor.shutdown(cancel_futures=True)
+
+        report = collisions.get_report()
+        collisions.close()
+        if report:
+            raise Exception(f"Found {len(report)} identifiers conflicts:\n" + "\n".join(report))
+
+    def update_all(self):
+        """
+            Write all generated files from rendered devices
+        """
+        with self.stats.stage('update_things'):
+            self.update_things(
+                file=self.openhab_path / THINGS_FILE,
+            )
+
+        with self.stats.stage('update_items'):
+            self.update_items(
+                file=self.openhab_path / ITEMS_FILE,
+            )
+
+        with self.stats.stage('update_rules'):
+            self.update_rules(
+                file=self.openhab_path / RULES_FILE,
+            )
+
+        with self.stats.stage('update_gen_sitemap'):
+            self.update_gen_sitemap(
+                file=self.openhab_path / SITEMAP_FILE,
+            )
+
+        with self.stats.stage('update_transform'):
+            self.update_transform(
+                dir=self.openhab_path / TRANSFORM_DIR,
+            )
 
         # One file per-instance
-        self.update_devices_yaml(
-            dir=self.config_path / "devices/",
-        )
+        with self.stats.stage('update_devices_yaml'):
+            self.update_devices_yaml(
+                dir=self.config_path / DEVICES_YAML_DIR,
+            )
+
+        with self.stats.stage('update_y2m_js'):
+            self.update_y2m_js(
+                file=self.openhab_path / Y2M_JS_FILE,
+            )
+
+        if self.manifest:
+            with self.stats.stage('update_manifest'):
+                self.update_manifest()
+
+    def update_manifest(self):
+        """
+            Remove files generated by last run and not generated anymore
+            (e.g. devices YAML of removed config), store manifest of this run
+        """
+        for file in self.manifest.get_stale():
+            logging.info("File %s is not generated anymore, will be removed", str(file))
+            self.remove_file(file)
+        if self.write:
+            self.manifest.save()
 
-        self.update_y2m_js(
-            file=self.openhab_path / "yandex2mqtt.codegen.js",
-        )
+    def get_files(self) -> Dict[str, str]:
+        """
+            All generated files in memory, nothing is written:
+            relative path -> content. Paths are relative to openHAB path,
+            except Zigbee devices configs 'devices/<config ID>.yaml' (relative to config path)
+        """
+        files: Dict[str, str] = dict()
+
+        def add(file: Path, lines: Iterable[str]):
+            files[file.as_posix()] = ''.join(line + '\n' for line in lines)
+
+        for gen, file in [
+                (self.gen_things, THINGS_FILE),
+                (self.gen_items, ITEMS_FILE),
+                (self.gen_rules, RULES_FILE)]:
+            for shard_file, renders in self.iter_sharded(file):
+                add(shard_file, gen(renders))
+        add(SITEMAP_FILE, self.gen_sitemap())
+        transform_files = self.get_transform_files()
+        for name in self.get_used_transforms():
+            if name in transform_files:
+                add(TRANSFORM_DIR / name, transform_files[name].read_text().splitlines())
+        for config in self.configs:
+            add(DEVICES_YAML_DIR / f"{config['id']}.yaml", self.gen_devices_yaml(config))
+        if self.config_y2m:
+            add(Y2M_TEMPLATE_FILE, self.gen_y2m_template())
+            add(Y2M_JS_FILE, self.gen_y2m_js())
+        return files
+
+    def count_stats(self):
+        """
+            Count generated objects per config
+        """
+        for config in self.configs:
+            self.stats.count(config['id'], 'devices', len(config['renders']))
+            for render in config['renders']:
+                self.stats.count(config['id'], 'things', sum(1 for l in render.things if l.startswith('Thing ')))
+                self.stats.count(config['id'], 'channels', sum(1 for l in render.things if l.startswith('\t\tType ')))
+                self.stats.count(config['id'], 'items', sum(1 for l in render.items if not l.startswith('//')))
+                self.stats.count(config['id'], 'rules_lines', len(render.rules_header) + len(render.rules))
+
+    def report_stats(self):
+        """
+            Print stats table to stderr, JSON to stats file (or stderr)
+        """
+        self.count_stats()
+        sys.stderr.write('\n'.join(self.stats.get_report_table()) + '\n')
+        if self.stats_file and str(self.stats_file) != '-':
+            with open(self.stats_file, 'w') as f:
+                f.write(self.stats.get_report_json() + '\n')
+        else:
+            sys.stderr.write(self.stats.get_report_json() + '\n')
+        self.stats.reset()
+
+    def watch(self):
+        """
+            Regenerate on config change.
+            Parsed configs, registry and rendered devices are kept in memory,
+            only changed files are parsed and only changed devices are rendered.
+        """
+        from .watch import create_watcher
+
+        if not self.cache:
+            self.cache = FragmentCache(None)
+        self.reuse_devices = not self.stream
+        if not self.stream:
+            self.parsed_items = dict()
+
+        self.run()
+
+        def is_config_file(file: Path) -> bool:
+            if file.parent == self.config_path:
+                return file.name == 'y2m.yaml'
+            return file.suffix == '.yaml'
+
+        watcher = create_watcher([self.config_path, self.config_path / 'conf'], is_config_file)
+        logging.info("Watching %s for changes", str(self.config_path))
+        try:
+            while True:
+                changed = watcher.wait()
+                start = time.monotonic()
+                logging.info("Changed: %s", ', '.join(sorted(str(f) for f in changed)))
+                try:
+                    self.load_config_yaml(self.config_path)
+                    self.run()
+                except Exception:
+                    logging.exception("Generation failed, waiting for next change")
+                    continue
+                logging.info("Regenerated in %.0f ms", (time.monotonic() - start) * 1000)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            watcher.close()
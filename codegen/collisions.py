@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+    Collision index of device and generated identifiers across all configs
+"""
+
+from typing import Dict, List, NamedTuple, Tuple
+
+
+class Owner(NamedTuple):
+    """
+        Origin of identifier: config file and device ID
+    """
+    file: str
+    device: str
+
+
+class Conflict(NamedTuple):
+    kind: str
+    uid: str
+    first: Owner
+    other: Owner
+
+
+class CollisionIndex:
+    """
+        Hash index (kind, id) -> first owner.
+        All conflicts are collected in one pass, then reported at once.
+        Same identifier added twice by one owner is not a conflict
+    """
+
+    # Human-readable names of identifier kinds
+    KINDS = {
+        'address': 'Device Address',
+        'device': 'Device ID',
+        'thing': 'Thing UID',
+        'channel': 'Channel UID',
+        'item': 'Item name',
+    }
+
+    def __init__(self) -> None:
+        self.owners: Dict[Tuple[str, str], Owner] = dict()
+        self.conflicts: List[Conflict] = list()
+
+    def add(self, kind: str, uid: str, owner: Owner) -> None:
+        first = self.owners.setdefault((kind, uid), owner)
+        if first is not owner:
+            self.conflicts.append(Conflict(kind, uid, first, owner))
+
+    def get_conflicts(self) -> List[Conflict]:
+        return self.conflicts
+
+    def get_report(self) -> List[str]:
+        return [
+            f"{self.KINDS[c.kind]} {c.uid} is not unique: "
+            f"device {c.other.device} ({c.other.file}) clashes with device {c.first.device} ({c.first.file})"
+            for c in self.get_conflicts()
+        ]
+
+
+class SpooledCollisionIndex(CollisionIndex):
+    """
+        Collision index for streaming mode: identifiers are spilled to disk
+        and checked at once, memory does not depend on number of devices
+    """
+
+    def __init__(self) -> None:
+        from .spool import SortedSpool
+        CollisionIndex.__init__(self)
+        self.spool = SortedSpool()
+        self.last_owner = None
+        self.owner_seq = 0
+
+    def add(self, kind: str, uid: str, owner: Owner) -> None:
+        if owner is not self.last_owner:
+            self.last_owner = owner
+            self.owner_seq += 1
+        self.spool.add(f'{kind}\0{uid}', f'{self.owner_seq}\0{owner.file}\0{owner.device}')
+
+    def get_conflicts(self) -> List[Conflict]:
+        conflicts = list()
+        first_key = None
+        first = None
+        for key, value in self.spool:
+            seq, file, device = value.split('\0')
+            if key != first_key:
+                first_key, first_seq, first = key, seq, Owner(file, device)
+            elif seq != first_seq:
+                kind, uid = key.split('\0', 1)
+                conflicts.append(Conflict(kind, uid, first, Owner(file, device)))
+        return conflicts
+
+    def close(self) -> None:
+        self.spool.close()
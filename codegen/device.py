@@ -1,12 +1,11 @@
-from pydoc_data.topics import topics
+import functools
 import re
-from typing import List
-import numpy as np
+import threading
+from typing import Dict, List, NamedTuple, Optional, Tuple
 from codegen.item import Generic_Item, Item, MQTT_Item
+from codegen.plan import DeviceTypePlan, PlanThingChannel, get_channel_type
 from codegen.thing import *
-from pprint import pprint
-import json
-import jinja2
+from codegen.templates import get_templates
 
 # Simple information channes, read only (all devices)
 DEVICE_SIMPLE_CHANNELS = [
@@ -43,16 +42,181 @@ DEVICE_SIMPLE_CHANNELS = [
 
 ]
 
+# Transform file referenced in channel or label: JS:<file>, JS(<file>), MAP(<file>), ...
+TRANSFORM_FILE_RE = re.compile(r'[:(]([A-Za-z0-9_.-]+\.(?:js|map))\b')
+
+
+class ChannelCatalog:
+    """
+        Index of simple channels by id
+    """
+
+    def __init__(self, channels: List[dict]) -> None:
+        self.channels = channels
+        self.by_id = {x['id']: x for x in channels}
+
+    def get(self, id: str) -> Optional[dict]:
+        return self.by_id.get(id, None)
+
+    def get_applicable(self, tags) -> Tuple[dict, ...]:
+        """
+            Simple channels enabled by device tags, in catalog order
+        """
+        return tuple(x for x in self.channels if x['id'] in tags)
+
+
+SIMPLE_CHANNELS = ChannelCatalog(DEVICE_SIMPLE_CHANNELS)
+
+
+class DeviceRender(NamedTuple):
+    """
+        Rendered device artifacts (config lines for each generated file)
+    """
+    things: Tuple[str, ...]
+    items: Tuple[str, ...]
+    sitemap: Tuple[str, ...]
+    rules_header: Tuple[str, ...]
+    rules: Tuple[str, ...]
+    # Zigbee device address and config for devices.yaml
+    zigbee_config: Optional[Tuple[str, dict]]
+    y2m: Tuple[str, ...]
+    # Generated identifiers: (kind, id), kind is 'thing', 'channel' or 'item'
+    uids: Tuple[Tuple[str, str], ...] = ()
+    # Transform files used by things and items
+    transforms: Tuple[str, ...] = ()
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'DeviceRender':
+        """
+            Restore from plain data (as stored in cache)
+        """
+        zigbee_config = data['zigbee_config']
+        return cls(
+            things=tuple(data['things']),
+            items=tuple(data['items']),
+            sitemap=tuple(data['sitemap']),
+            rules_header=tuple(data['rules_header']),
+            rules=tuple(data['rules']),
+            zigbee_config=tuple(zigbee_config) if zigbee_config else None,
+            y2m=tuple(data['y2m']),
+            uids=tuple(tuple(x) for x in data.get('uids', [])),
+            transforms=tuple(data.get('transforms', [])),
+        )
+
+
+# Global tags vocabulary: tag -> bit in DeviceTypeTags.mask
+TAGS_BITS: Dict[str, int] = {}
+# Types may be compiled concurrently (library API used from threads)
+TAGS_LOCK = threading.Lock()
+
+
+def register_tags(tags) -> None:
+    with TAGS_LOCK:
+        for tag in tags:
+            if tag not in TAGS_BITS:
+                TAGS_BITS[tag] = len(TAGS_BITS)
+                get_tags_mask.cache_clear()
+
+
+@functools.lru_cache(maxsize=None)
+def get_tags_mask(tags: Tuple[str, ...]) -> int:
+    """
+        Bitmask of tags, unknown tags (not used by any type) are ignored
+    """
+    mask = 0
+    for tag in tags:
+        if tag in TAGS_BITS:
+            mask |= 1 << TAGS_BITS[tag]
+    return mask
+
+
+class DeviceTypeTags:
+    """
+        Tags of device type, compiled once and shared by all devices of this type
+    """
+
+    __slots__ = ('types', 'tags', 'mask', 'tasmota_sensors', 'tasmota_sensors_mask')
+
+    def __init__(self, config_type) -> None:
+        self.types = tuple(config_type['types'])
+        self.tasmota_sensors = frozenset(x['type'] for x in config_type.get('tasmota_sensors', []))
+        register_tags(self.types)
+        register_tags(sorted(self.tasmota_sensors))
+        self.tags = frozenset(self.types)
+        self.mask = get_tags_mask(self.types)
+        self.tasmota_sensors_mask = get_tags_mask(tuple(self.tasmota_sensors))
+
+    def __reduce__(self):
+        # Bits are process-local: compile again in worker process
+        tasmota_sensors = [{'type': x} for x in self.tasmota_sensors]
+        return (DeviceTypeTags, ({'types': self.types, 'tasmota_sensors': tasmota_sensors},))
+
+    def has_any(self, tags: Tuple[str, ...]) -> bool:
+        return bool(self.mask & get_tags_mask(tags))
+
+    def has_tasmota_sensor_any(self, tags: Tuple[str, ...]) -> bool:
+        return bool(self.tasmota_sensors_mask & get_tags_mask(tags))
+
+
+class DeviceTypeChannels:
+    """
+        Channels of device type, resolved once in SIMPLE_CHANNELS catalog
+    """
+
+    __slots__ = ('simple_channels', 'tasmota_sensors')
+
+    def __init__(self, config_type, catalog: ChannelCatalog = SIMPLE_CHANNELS) -> None:
+        # Simple channels, enabled by type tags
+        self.simple_channels = catalog.get_applicable(frozenset(config_type['types']))
+        # Tasmota sensors: (sensor, lower-cased channel id, simple channel or None)
+        self.tasmota_sensors = tuple(
+            (sensor, sensor['id'].lower(), catalog.get(sensor['id'].lower()))
+            for sensor in config_type.get('tasmota_sensors', [])
+        )
+
+
+def get_rules_batch(devices: List['Device']) -> List[Tuple[List[str], List[str]]]:
+    """
+        Rules header and rules for many devices, each template is rendered
+        once for all devices using it. Same result as get_rules_header() and get_rules()
+    """
+    templates = get_templates()
+    result = [([], []) for _ in devices]
+    batches = [
+        ('ct_rule_header.rules', 0, lambda device: device.has_ct_rule()),
+        ('ct_rule.rules', 1, lambda device: device.has_ct_rule()),
+        ('proxy_state.rules', 1, lambda device: device.has_proxy_rule()),
+    ]
+    for name, part, check in batches:
+        indexes = [i for i, device in enumerate(devices) if check(device)]
+        rendered = templates.render_batch(name, [devices[i] for i in indexes])
+        for i, lines in zip(indexes, rendered):
+            result[i][part].extend(lines)
+    return result
+
+
 class Device:
     """
         Represents device record from config
     """
 
-    def __init__(self, config_device, config_type) -> None:
+    def __init__(
+        self,
+        config_device,
+        config_type,
+        type_tags: Optional[DeviceTypeTags] = None,
+        type_channels: Optional[DeviceTypeChannels] = None,
+        type_plan: Optional[DeviceTypePlan] = None,
+    ) -> None:
         self.type = config_type
-        self.tags = config_type['types'] # Device 'tags'
+        self.type_tags = type_tags or DeviceTypeTags(config_type)
+        self.type_channels = type_channels or DeviceTypeChannels(config_type)
+        self.type_plan = type_plan or DeviceTypePlan(config_type, self.type_channels.simple_channels)
+        self.tags = self.type_tags.tags # Device 'tags'
         self.config_device = config_device
         self.channels = config_device.get('channels', {})
+        # Channels by lower-cased name (last one wins)
+        self.channels_lower = {ch.lower(): cfg for ch, cfg in self.channels.items()}
         self.sensors = config_device.get('sensors', {})
         self.expire = config_device.get('expire', None)
         self.expire_sec = self.get_expire_sec()
@@ -62,10 +226,6 @@ class Device:
         self.labels = config_device.get('labels', {})
         self.y2m = config_device.get('y2m', {})
 
-        # If device needs rules, we will store it here
-        self.rules_header = []
-        self.rules = []
-
         # Device ID
         # Simple: just use ID
         if 'id' in config_device:
@@ -141,14 +301,14 @@ class Device:
 
     def get_device_address(self):
         # Zigbee: return device address
-        if np.in1d(['zigbee'], self.type['types']).any():
+        if 'zigbee' in self.tags:
             return self.zigbee_id
         # Others: return device ID
         return self.id
 
     def get_device_address_short(self):
         # Zigbee: return device address
-        if np.in1d(['zigbee'], self.type['types']).any():
+        if 'zigbee' in self.tags:
             return self.zigbee_id[-4:]
         # Others: return device ID
         return self.id
@@ -220,11 +380,7 @@ class Device:
         return self.name
 
     def get_channel_type_from_item(self, item: dict) -> str:
-        item_type = item['type']
-        if 'Number' in item_type: return 'number'
-        if 'Switch' in item_type: return 'switch'
-        if 'Contact' in item_type: return 'contact'
-        return 'string'
+        return get_channel_type(item)
 
     # Request remap some channels?
     def get_mqtt_remap(self, id: str) -> str:
@@ -235,6 +391,23 @@ class Device:
             return self.type['mqtt_remap'][id]
         return id
 
+    def get_plan_params(self) -> dict:
+        """
+            Device values for render plan templates (see PLAN_PARAMS)
+        """
+        return {
+            'state_topic': f"{self.mqtt_topic}/{self.id}",
+            'command_topic': f"{self.mqtt_topic}/{self.id}/set",
+            'channel_id': None,
+            'transition_sw': self.transition_sw,
+            'transition_brightness': self.transition_brightness,
+            'expire_sec': self.expire_sec,
+            'brightness_min': self.brightness_min,
+            'brightness_max': self.brightness_max,
+            'ct_min': self.ct_min,
+            'ct_max': self.ct_max,
+        }
+
     def get_expire_sec(self) -> int:
         ret = 0
         if not self.expire:
@@ -260,22 +433,22 @@ class Device:
         return False
 
     def is_tasmota(self) -> bool:
-        return np.in1d(['tasmota'], self.tags).any()
+        return 'tasmota' in self.tags
 
     def is_zigbee(self) -> bool:
-        return np.in1d(['zigbee'], self.tags).any()
+        return 'zigbee' in self.tags
 
     def is_petrows(self) -> bool:
-        return np.in1d(['petrows'], self.tags).any()
+        return 'petrows' in self.tags
 
     def has_monitoring(self) -> bool:
-        return np.in1d(['activity'], self.tags).any()
+        return 'activity' in self.tags
 
     def has_tag(self, tag: str) -> bool:
         return tag in self.tags
 
     def has_tag_any(self, *tags) -> bool:
-        return np.in1d(tags, self.tags).any()
+        return self.type_tags.has_any(tags)
 
     def has_tasmota_sensors_types(self) -> List[str]:
         if 'tasmota_sensors' in self.type:
@@ -283,16 +456,92 @@ class Device:
         return []
 
     def has_tasmota_sensor(self, tag: str) -> bool:
-        return tag in self.has_tasmota_sensors_types()
+        return tag in self.type_tags.tasmota_sensors
 
     def has_tasmota_sensor_any(self, *tags) -> bool:
-        return np.in1d(tags, self.has_tasmota_sensors_types()).any()
+        return self.type_tags.has_tasmota_sensor_any(tags)
+
+    def has_ct_rule(self) -> bool:
+        return self.is_zigbee() and self.has_tag('ct') and self.ct_auto
+
+    def has_proxy_rule(self) -> bool:
+        return self.has_tag_any('lamp', 'plug') and self.proxy_state
 
     def get_rules(self) -> List[str]:
-        return self.rules
+        """
+            Rules for this device (placed in 'gen_auto.rules')
+        """
+        rules = []
+        # Apply color temp when device is ON
+        if self.has_ct_rule():
+            rules.extend(get_templates().render("ct_rule.rules", self))
+        # Proxy events from groups
+        if self.has_proxy_rule():
+            rules.extend(get_templates().render("proxy_state.rules", self))
+        return rules
 
     def get_rules_header(self) -> List[str]:
-        return self.rules_header
+        """
+            Rules global variables (placed in 'gen_auto.rules' before all rules)
+        """
+        rules_header = []
+        if self.has_ct_rule():
+            rules_header.extend(get_templates().render("ct_rule_header.rules", self))
+        return rules_header
+
+    def render(self, rules_header: Optional[List[str]] = None, rules: Optional[List[str]] = None) -> DeviceRender:
+        """
+            Render all device artifacts at once.
+            Rules may be passed already rendered (see get_rules_batch())
+        """
+        if rules_header is None:
+            rules_header = self.get_rules_header()
+        if rules is None:
+            rules = self.get_rules()
+        things = self.get_things()
+        items = self.get_items()
+
+        uids = []
+
+        things_str = list(self.get_comment())
+        for thing in things:
+            things_str.extend(thing.get_config())
+            if thing.get_uid():
+                uids.append(('thing', thing.get_uid()))
+            uids.extend(('channel', uid) for uid in thing.get_channels_uids())
+
+        items_str = list(self.get_comment())
+        sitemap_str = [f'Frame label="{self.get_label()}" {{']
+        sitemap_str.extend(self.get_comment())
+        for item in items:
+            items_str.extend(item.get_config())
+            sitemap_str.extend(item.get_sitemap_config())
+            uids.append(('item', item.id))
+        sitemap_str.append('}')
+
+        zigbee_config = None
+        if self.is_zigbee():
+            device_conf = {}
+            device_conf['friendly_name'] = self.get_id()
+            device_conf = device_conf | self.get_zigbee_device_config()
+            zigbee_config = (self.get_device_address(), device_conf)
+
+        y2m = []
+        if self.has_y2m():
+            y2m = self.get_y2m_config()
+
+        return DeviceRender(
+            things=tuple(things_str),
+            items=tuple(items_str),
+            sitemap=tuple(sitemap_str),
+            rules_header=tuple(rules_header),
+            rules=tuple(rules),
+            zigbee_config=zigbee_config,
+            y2m=tuple(y2m),
+            uids=tuple(uids),
+            transforms=tuple(sorted(set(
+                TRANSFORM_FILE_RE.findall('\n'.join(things_str + items_str))))),
+        )
 
     def get_things(self) -> List[Thing]:
         """
@@ -394,26 +643,21 @@ class Device:
                     args=channel_args,
                 ))
 
-        # Tasmota sensors
-        if 'tasmota_sensors' in self.type:
-            for channel in self.type['tasmota_sensors']:
-                channel_args = {
-                    'stateTopic': sensor_topic,
-                    'transformationPattern': f"JSONPATH:${channel['path']}",
-                }
-                # Fix reserved values usage
-                channel_id = channel['id'].lower()
-                # Find channel in simple-channels
-                channel_simple = next((x for x in DEVICE_SIMPLE_CHANNELS if x['id'] == channel_id), None)
-                if channel_simple:
-                    if 'unit' in channel_simple:
-                        channel_args['unit'] = channel_simple['unit']
+        # Tasmota sensors (channel ID is lower-cased to fix reserved values usage)
+        for channel, channel_id, channel_simple in self.type_channels.tasmota_sensors:
+            channel_args = {
+                'stateTopic': sensor_topic,
+                'transformationPattern': f"JSONPATH:${channel['path']}",
+            }
+            if channel_simple:
+                if 'unit' in channel_simple:
+                    channel_args['unit'] = channel_simple['unit']
 
-                channels.append(MQTT_ThingChannel(
-                    type='number',
-                    id=channel_id,
-                    args=channel_args,
-                ))
+            channels.append(MQTT_ThingChannel(
+                type='number',
+                id=channel_id,
+                args=channel_args,
+            ))
 
         # Get Thing
 
@@ -429,373 +673,21 @@ class Device:
     def get_things_zigbee(self) -> List[Thing]:
         """
             Things for Zigbee.
-            It has MQTT driven items, generate thing from this device
+            It has MQTT driven items, generate thing from this device.
+            Channels are rendered from device type plan (see DeviceTypePlan)
         """
 
         channels = []
+        params = self.get_plan_params()
 
-        command_topic = f"{self.mqtt_topic}/{self.id}/set"
-        state_topic = f"{self.mqtt_topic}/{self.id}"
-
-        # Device has switch (Lamp, Wall socket)
-        if self.has_tag_any('lamp', 'plug'):
-            channels.append(MQTT_ThingChannel(
-                type='switch',
-                id='state',
-                args={
-                    'stateTopic': state_topic,
-                    'commandTopic': command_topic,
-                    'transformationPattern': 'JSONPATH:$.state',
-                    'transformationPatternOut': f'JS:codegen-cmd-value.js?f=state&t={self.transition_sw}&exp={self.expire_sec}',
-                },
-            ))
-        # Device has switch (multi-gang) option
-        if self.has_tag('plug_mt'):
-            for channel_id, _ in self.channels.items():
-                channels.append(MQTT_ThingChannel(
-                    type='switch',
-                    id=f'state_{channel_id}',
-                    args={
-                        'stateTopic': state_topic,
-                        'commandTopic': command_topic,
-                        'transformationPattern': f'JSONPATH:$.state_{channel_id}',
-                        'formatBeforePublish': json.dumps({f'state_{channel_id}': "%s"})
-                    },
-                ))
-
-        # Device has curtain/blinds (single-gang) option
-        if self.has_tag('blinds'):
-            channels.append(MQTT_ThingChannel(
-                type='string',
-                id=f'moving',
-                args={
-                    'stateTopic': state_topic,
-                    'transformationPattern': f'JSONPATH:$.moving',
-                },
-            ))
-            channels.append(MQTT_ThingChannel(
-                type='string',
-                id=f'state',
-                args={
-                    'stateTopic': state_topic,
-                    'commandTopic': command_topic,
-                    'transformationPattern': f'JSONPATH:$.state',
-                    'formatBeforePublish': json.dumps({f'state': "%s"})
-                },
-            ))
-            channels.append(MQTT_ThingChannel(
-                type='dimmer',
-                id=f'position',
-                args={
-                    'stateTopic': state_topic,
-                    'commandTopic': command_topic,
-                    'transformationPattern': f'JS:codegen-rpos.js?channel=position',
-                    'transformationPatternOut': f'JS:codegen-cmd-rpos.js?channel=position',
-                },
-            ))
-            channels.append(MQTT_ThingChannel(
-                type='switch',
-                id=f'calibration',
-                args={
-                    'stateTopic': state_topic,
-                    'commandTopic': command_topic,
-                    'transformationPattern': f'JSONPATH:$.calibration',
-                    'formatBeforePublish': json.dumps({f'calibration': "%s"})
-                },
-            ))
-        # Device has curtain/blinds (multi-gang) option
-        if self.has_tag('blinds_mt'):
-            for channel_id, _ in self.channels.items():
-                channels.append(MQTT_ThingChannel(
-                    type='string',
-                    id=f'moving_{channel_id}',
-                    args={
-                        'stateTopic': state_topic,
-                        'transformationPattern': f'JSONPATH:$.moving_{channel_id}',
-                    },
-                ))
-                channels.append(MQTT_ThingChannel(
-                    type='string',
-                    id=f'state_{channel_id}',
-                    args={
-                        'stateTopic': state_topic,
-                        'commandTopic': command_topic,
-                        'transformationPattern': f'JSONPATH:$.state_{channel_id}',
-                        'formatBeforePublish': json.dumps({f'state_{channel_id}': "%s"})
-                    },
-                ))
-                channels.append(MQTT_ThingChannel(
-                    type='dimmer',
-                    id=f'position_{channel_id}',
-                    args={
-                        'stateTopic': state_topic,
-                        'commandTopic': command_topic,
-                        'transformationPattern': f'JS:codegen-rpos.js?channel=position_{channel_id}',
-                        'transformationPatternOut': f'JS:codegen-cmd-rpos.js?channel=position_{channel_id}',
-                    },
-                ))
-                channels.append(MQTT_ThingChannel(
-                    type='switch',
-                    id=f'calibration_{channel_id}',
-                    args={
-                        'stateTopic': state_topic,
-                        'commandTopic': command_topic,
-                        'transformationPattern': f'JSONPATH:$.calibration_{channel_id}',
-                        'formatBeforePublish': json.dumps({f'calibration_{channel_id}': "%s"})
-                    },
-                ))
-        # Lamps have dimmer
-        if self.has_tag('lamp'):
-            # Normal control point
-            channels.append(MQTT_ThingChannel(
-                type='dimmer',
-                id='dim',
-                args={
-                    'stateTopic': state_topic,
-                    'commandTopic': command_topic,
-                    'transformationPattern': 'REGEX:(.*"brightness".*)∩JS:codegen-brightness.js',
-                    'transformationPatternOut': 'JS:codegen-cmd-value.js?f=brightness&t=' + str(self.transition_brightness) + '&exp=0',
-                    'min': self.brightness_min,  # Dedvice type could change that
-                    'max': self.brightness_max,
-                },
-            ))
-            # Control point for fast change - for dimmers
-            channels.append(MQTT_ThingChannel(
-                type='dimmer',
-                id='dim_fast',
-                args={
-                    'stateTopic': state_topic,
-                    'commandTopic': command_topic,
-                    'transformationPattern': 'REGEX:(.*"brightness".*)∩JS:codegen-brightness.js',
-                    'transformationPatternOut': 'JS:codegen-cmd-value.js?f=brightness&t=0&exp=0',
-                    'min': self.brightness_min,  # Dedvice type could change that
-                    'max': self.brightness_max,
-                },
-            ))
-        # Lamps have color temp?
-        if self.has_tag('ct'):
-            channels.append(MQTT_ThingChannel(
-                type='dimmer',
-                id='ct',
-                args={
-                    'stateTopic': state_topic,
-                    'commandTopic': command_topic,
-                    'transformationPattern': 'REGEX:(.*"color_temp".*)∩JSONPATH:$.color_temp',
-                    'transformationPatternOut': 'JS:codegen-cmd-value.js?f=color_temp&t=3&exp=0',
-                    'min': self.ct_min,
-                    'max': self.ct_max,
-                },
-            ))
-        # Lamps have color?
-        if self.has_tag('color'):
-            channels.append(MQTT_ThingChannel(
-                type='color',
-                id='color',
-                args={
-                    'commandTopic': command_topic,
-                    'transformationPatternOut': 'JS:codegen-cmd-color_xy.js',
-                },
-            ))
-            channels.append(MQTT_ThingChannel(
-                type='string',
-                id='color_mode',
-                args={
-                    'stateTopic': state_topic,
-                    'transformationPattern': 'REGEX:(.*"color_mode".*)∩JSONPATH:$.color_mode',
-                },
-            ))
-        # Device is remote
-        if self.has_tag('remote'):
-            channels.append(MQTT_ThingChannel(
-                type='string',
-                id='action',
-                args={
-                    'stateTopic': state_topic,
-                    'commandTopic': command_topic,
-                    'transformationPattern': 'REGEX:(.*"action".*)∩JSONPATH:$.action',
-                    'trigger': 'true',
-                },
-            ))
-            # Simulate brightness?
-            if self.is_simulated_brightness():
-                # Saved brightness (absolute value)
-                channels.append(MQTT_ThingChannel(
-                    type='dimmer',
-                    id='dim',
-                    args={
-                        'stateTopic': state_topic,
-                        'transformationPattern': 'REGEX:(.*"action_brightness_delta".*)∩JSONPATH:$.brightness',
-                        'min': 1,
-                        'max': 255,
-                    },
-                ))
-                # Delta brightness (relative value)
-                channels.append(MQTT_ThingChannel(
-                    type='number',
-                    id='action_dim',
-                    args={
-                        'stateTopic': state_topic,
-                        'transformationPattern': 'REGEX:(.*"action_brightness_delta".*)∩JSONPATH:$.action_brightness_delta',
-                        'trigger': 'true',
-                    },
-                ))
-        # Device is TRV
-        if self.has_tag('thermostat'):
-            channels.append(MQTT_ThingChannel(
-                type='number',
-                id='thermostat',
-                args={
-                    'stateTopic': state_topic,
-                    'commandTopic': command_topic,
-                    'transformationPattern': 'REGEX:(.*"current_heating_setpoint".*)∩JSONPATH:$.current_heating_setpoint',
-                    'transformationPatternOut': 'JS:codegen-cmd-float.js?f=current_heating_setpoint',
-                    'unit': 'C°',
-                },
-            ))
-            channels.append(MQTT_ThingChannel(
-                type='string',
-                id='thermostat_mode',
-                args={
-                    'stateTopic': state_topic,
-                    'commandTopic': command_topic,
-                    'transformationPattern': 'REGEX:(.*"system_mode".*)∩JSONPATH:$.system_mode',
-                    'formatBeforePublish': json.dumps({'system_mode': '%s'})
-                },
-            ))
-            channels.append(MQTT_ThingChannel(
-                type='string',
-                id='thermostat_preset',
-                args={
-                    'stateTopic': state_topic,
-                    'commandTopic': command_topic,
-                    'transformationPattern': 'REGEX:(.*"preset".*)∩JSONPATH:$.preset',
-                    'formatBeforePublish': json.dumps({'preset': '%s'})
-                },
-            ))
-            # Command topic depends on control mode
-            control_mode_js = ''
-            if self.thermostat_control_mode != 'system_mode':
-                control_mode_js = '-' + self.thermostat_control_mode
-            channels.append(MQTT_ThingChannel(
-                type='switch',
-                id='thermostat_enable',
-                args={
-                    'stateTopic': state_topic,
-                    'commandTopic': command_topic,
-                    'transformationPattern': f'REGEX:(.*"system_mode".*)∩JS:codegen-thermostat-enable{control_mode_js}.js',
-                    'transformationPatternOut': f'JS:codegen-cmd-thermostat-enable{control_mode_js}.js',
-                },
-            ))
-            # Local calibration value
-            channels.append(MQTT_ThingChannel(
-                type='string',
-                id='local_temperature_calibration',
-                args={
-                    'stateTopic': state_topic,
-                    'commandTopic': command_topic,
-                    'transformationPattern': 'REGEX:(.*"local_temperature_calibration".*)∩JSONPATH:$.local_temperature_calibration',
-                    'transformationPatternOut': 'JS:codegen-cmd-float.js?f=local_temperature_calibration',
-                    'unit': 'C°',
-                },
-            ))
-
-        for metric in DEVICE_SIMPLE_CHANNELS:
-            if self.has_tag(metric['id']):
-                # Topic ID to be parsed from MQTT
-                topic_item_id = metric.get('topic_id', metric["id"])
-                # Remap topic ID?
-                topic_item_id = self.get_mqtt_remap(topic_item_id)
-                args = {
-                    'stateTopic': state_topic,
-                    'transformationPattern': f'REGEX:(.*"{topic_item_id}".*)∩JSONPATH:$.{topic_item_id}',
-                }
-                if 'unit' in metric:
-                    args['unit'] = metric['unit']
-                if 'channel_args' in metric:
-                    args = args | metric['channel_args']
-                channels.append(MQTT_ThingChannel(
-                    type=self.get_channel_type_from_item(metric),
-                    id=metric['id'],
-                    args=args,
-                ))
-
-        # Monitoring?
-        if self.has_monitoring():
-            channels.append(MQTT_ThingChannel(
-                type='datetime',
-                id='activity',
-                args={
-                    'stateTopic': state_topic,
-                    'transformationPattern': "JS:codegen-activity.js",
-                },
-            ))
-
-        # Battery control
-        if self.has_tag('battery'):
-            channels.append(MQTT_ThingChannel(
-                type='switch',
-                id='battery_low',
-                args={
-                    'stateTopic': state_topic,
-                    'transformationPattern': 'REGEX:(.*"battery".*)∩JS:codegen-lowbat.js',
-                },
-            ))
-        else:
-            if self.has_tag('battery_low'):
-                channels.append(MQTT_ThingChannel(
-                    type='switch',
-                    id='battery_low',
-                    args={
-                        'stateTopic': state_topic,
-                        'transformationPattern': 'REGEX:(.*"battery_low".*)∩JSONPATH:$.battery_low',
-                        'on': 'true',
-                        'off': 'false',
-                    },
-                ))
-
-        # If device reports battery voltage, we can decide
-        if self.has_tag('battery_voltage'):
-            batt_type = self.type['batt_type']
-            channels.append(MQTT_ThingChannel(
-                type='switch',
-                id='battery_low',
-                args={
-                    'stateTopic': state_topic,
-                    'transformationPattern': f'REGEX:(.*"battery".*)∩S:codegen-lowbat-{batt_type}.js',
-                    'unit': 'mV',
-                },
-            ))
-
-        # Zigbee channels
-        channels.append(MQTT_ThingChannel(
-            type='number',
-            id='link',
-            args={
-                'stateTopic': state_topic,
-                'transformationPattern': 'REGEX:(.*"linkquality".*)∩JSONPATH:$.linkquality',
-            },
-        ))
-        channels.append(MQTT_ThingChannel(
-            type='switch',
-            id='ota',
-            args={
-                'stateTopic': state_topic,
-                'transformationPattern': 'REGEX:(.*"update_available".*)∩JSONPATH:$.update_available',
-                'on': 'true',
-                'off': 'false',
-            },
-        ))
-
-        # Monitoring?
-        if self.has_monitoring():
-            channels.append(MQTT_ThingChannel(
-                type='datetime',
-                id='activity',
-                args={
-                    'stateTopic': state_topic,
-                    'transformationPattern': "JS:codegen-activity.js",
-                },
-            ))
+        for block in self.type_plan.things:
+            if block.when and not getattr(self, block.when)():
+                continue
+            # Channels of multi-gang devices
+            for channel_id in (self.channels if block.per_channel else (None,)):
+                params['channel_id'] = channel_id
+                for spec in block.specs:
+                    channels.append(PlanThingChannel(spec, spec.id.render(params), spec.get_values(params)))
 
         # Get Thing
 
@@ -980,10 +872,7 @@ class Device:
                         groups=self.get_groups(type='sw'),
                     )
                 )
-                # Add rules to proxy events
-                environment = jinja2.Environment(loader=jinja2.FileSystemLoader("rules/"))
-                template = environment.get_template("proxy_state.rules")
-                self.rules.extend(template.render(item=self).splitlines())
+                # Rules to proxy events: see get_rules()
 
             items.append(
                 MQTT_Item(
@@ -1118,23 +1007,19 @@ class Device:
                     )
                 )
 
-        for metric in DEVICE_SIMPLE_CHANNELS:
-            if self.has_tag(metric['id']):
-                if 'icon' not in metric:
-                    metric['icon'] = metric['id']
-                # print(f"Simple cahhenl for {self.id}: {metric['id']}, total items: {len(items)}")
-                items.append(
-                    MQTT_Item(
-                        id=f'{self.id}_{metric["id"]}',
-                        name=f'{self.name} {self.labels.get(metric["id"], metric["title"])}',
-                        type=metric["type"],
-                        icon=self.get_icon(default=metric["icon"]),
-                        groups=self.get_groups(type=metric["id"]),
-                        broker=self.config['mqtt_broker_id'],
-                        channel_id=f'{self.id}:{metric["id"]}',
-                        sitemap_type='Text',
-                    )
+        for metric in self.type_channels.simple_channels:
+            items.append(
+                MQTT_Item(
+                    id=f'{self.id}_{metric["id"]}',
+                    name=f'{self.name} {self.labels.get(metric["id"], metric["title"])}',
+                    type=metric["type"],
+                    icon=self.get_icon(default=metric.get("icon", metric["id"])),
+                    groups=self.get_groups(type=metric["id"]),
+                    broker=self.config['mqtt_broker_id'],
+                    channel_id=f'{self.id}:{metric["id"]}',
+                    sitemap_type='Text',
                 )
+            )
 
         return items
 
@@ -1149,10 +1034,7 @@ class Device:
         for channel in self.type['tasmota_channels']:
             # Check device channels - has defined config in end-device?
             channel_id = channel['id'].lower()
-            channel_cfg = None
-            for ch in self.channels:
-                if ch.lower() == channel_id:
-                    channel_cfg = self.channels[ch]
+            channel_cfg = self.channels_lower.get(channel_id, None)
             if channel_cfg:
                 channel_type = 'Switch'
                 channel_sitemap_type = 'Switch'
@@ -1185,235 +1067,58 @@ class Device:
                 )
 
         # Tasmota sensors
-        if 'tasmota_sensors' in self.type:
-            for channel in self.type['tasmota_sensors']:
-                channel_id = channel['id'].lower()
-                channel_group_type = channel['id'].lower()
-                # Find channel in simple-channels
-                channel_simple = next((x for x in DEVICE_SIMPLE_CHANNELS if x['id'] == channel_id), None)
-                if not channel_simple:
-                    continue
-                channel_icon = channel_id
-                if 'icon' in channel_simple:
-                    channel_icon = channel_simple['icon']
+        for channel, channel_id, channel_simple in self.type_channels.tasmota_sensors:
+            channel_group_type = channel_id
+            if not channel_simple:
+                continue
+            channel_icon = channel_id
+            if 'icon' in channel_simple:
+                channel_icon = channel_simple['icon']
 
-                items.append(
-                    MQTT_Item(
-                        id=f"{self.id}_{channel_id}",
-                        name=f'{self.name} {channel_simple['title']}',
-                        type=channel_simple['type'],
-                        icon=self.get_icon(default=channel_icon),
-                        groups=self.get_channel_groups(channel=channel_id, type=channel_group_type),
-                        broker=self.config['mqtt_broker_id'],
-                        channel_id=f'{self.id}:{channel_id}',
-                        sitemap_type='Text',
-                    )
+            items.append(
+                MQTT_Item(
+                    id=f"{self.id}_{channel_id}",
+                    name=f'{self.name} {channel_simple['title']}',
+                    type=channel_simple['type'],
+                    icon=self.get_icon(default=channel_icon),
+                    groups=self.get_channel_groups(channel=channel_id, type=channel_group_type),
+                    broker=self.config['mqtt_broker_id'],
+                    channel_id=f'{self.id}:{channel_id}',
+                    sitemap_type='Text',
                 )
+            )
 
         return items
 
     def get_items_zigbee(self) -> List[Item]:
         """
             Things for Zigbee.
-            It has MQTT driven items, generate thing from this device
+            It has MQTT driven items, generate thing from this device.
+            Items are rendered from device type plan (see DeviceTypePlan)
         """
 
         items = list()
-
-        # All zigbee lamps have dimmer
-        if self.has_tag('lamp'):
-            # Normal (with transition)
-            items.append(
-                MQTT_Item(
-                    id=f"{self.id}_dim",
-                    name=f'{self.name} DIM [%d %%]',
-                    type='Dimmer',
-                    icon=self.get_icon(default='light'),
-                    groups=self.get_groups(type='dim'),
-                    broker=self.config['mqtt_broker_id'],
-                    channel_id=f'{self.id}:dim',
-                    sitemap_type='Slider',
-                )
-            )
-            # Fast control (for dimmers)
-            items.append(
-                MQTT_Item(
-                    id=f"{self.id}_dim_fast",
-                    name=f'{self.name} DIM-F [%d %%]',
-                    type='Dimmer',
-                    groups=self.get_groups(type='dim_fast'),
-                    broker=self.config['mqtt_broker_id'],
-                    channel_id=f'{self.id}:dim_fast',
-                )
-            )
-
-        # Some zigbee lamps have ct
-        if self.has_tag('ct'):
-            items.append(
-                MQTT_Item(
-                    id=f"{self.id}_ct",
-                    name=f'{self.name} CT [JS(codegen-mired.js): %s]',
-                    type='Dimmer',
-                    icon=self.get_icon(default='light'),
-                    groups=self.get_groups(type='ct'),
-                    broker=self.config['mqtt_broker_id'],
-                    channel_id=f'{self.id}:ct',
-                    sitemap_type='Slider',
-                )
-            )
-            if self.ct_auto:
-                environment = jinja2.Environment(loader=jinja2.FileSystemLoader("rules/"))
-                template = environment.get_template("ct_rule_header.rules")
-                self.rules_header.extend(template.render(item=self).splitlines())
-                template = environment.get_template("ct_rule.rules")
-                self.rules.extend(template.render(item=self).splitlines())
-
-        # Some zigbee lamps have color
-        if self.has_tag('color'):
-            items.append(
-                MQTT_Item(
-                    id=f"{self.id}_color",
-                    name=f'{self.name} Color',
-                    type='Color',
-                    icon='colorwheel',
-                    groups=self.get_groups(type='color'),
-                    broker=self.config['mqtt_broker_id'],
-                    channel_id=f'{self.id}:color',
-                    sitemap_type='Colorpicker',
-                )
-            )
-            items.append(
-                MQTT_Item(
-                    id=f"{self.id}_color_mode",
-                    name=f'{self.name} Color mode',
-                    type='String',
-                    icon='colorwheel',
-                    groups=self.get_groups(type='color_mode'),
-                    broker=self.config['mqtt_broker_id'],
-                    channel_id=f'{self.id}:color_mode',
-                    sitemap_type='Text',
-                )
-            )
-
-        if self.has_tag('remote'):
-            # Simulate brightness?
-            if self.is_simulated_brightness():
+        broker = self.config['mqtt_broker_id']
+        # No custom groups: use groups from plan
+        custom_groups = self.groups or self.groups_skip_auto
+
+        for block in self.type_plan.items:
+            if block.when and not getattr(self, block.when)():
+                continue
+            for id, label, type, channel, group, icon, device_icon, sitemap_type, auto_groups in block.specs:
                 items.append(
                     MQTT_Item(
-                        id=f"{self.id}_dim",
-                        name=f'{self.name} DIM [%d %%]',
-                        type='Dimmer',
-                        icon=self.get_icon(default='light'),
-                        groups=self.get_groups(type='dim'),
-                        broker=self.config['mqtt_broker_id'],
-                        channel_id=f'{self.id}:dim',
-                        sitemap_type='Text',
+                        id=f"{self.id}_{id}",
+                        name=f'{self.name} {label}',
+                        type=type,
+                        icon=self.get_icon(default=icon) if device_icon else icon,
+                        groups=self.get_groups(type=group) if custom_groups else auto_groups,
+                        broker=broker,
+                        channel_id=f'{self.id}:{channel}',
+                        sitemap_type=sitemap_type,
                     )
                 )
 
-        if self.has_tag('thermostat'):
-            items.append(
-                MQTT_Item(
-                    id=f"{self.id}_thermostat",
-                    name=f'{self.name} SET [%.0f %unit%]',
-                    type='Number:Temperature',
-                    icon='heatingt',
-                    groups=self.get_groups(type='thermostat'),
-                    broker=self.config['mqtt_broker_id'],
-                    channel_id=f'{self.id}:thermostat',
-                    sitemap_type='Setpoint',
-                )
-            )
-            items.append(
-                MQTT_Item(
-                    id=f"{self.id}_thermostat_mode",
-                    name=f'{self.name} MODE [%s]',
-                    type='String',
-                    icon='heatingt',
-                    groups=self.get_groups(type='thermostat_mode'),
-                    broker=self.config['mqtt_broker_id'],
-                    channel_id=f'{self.id}:thermostat_mode',
-                    sitemap_type='Text',
-                )
-            )
-            items.append(
-                MQTT_Item(
-                    id=f"{self.id}_thermostat_preset",
-                    name=f'{self.name} PRESET [%s]',
-                    type='String',
-                    icon='heatingt',
-                    groups=self.get_groups(type='thermostat_preset'),
-                    broker=self.config['mqtt_broker_id'],
-                    channel_id=f'{self.id}:thermostat_preset',
-                    sitemap_type='Text',
-                )
-            )
-            items.append(
-                MQTT_Item(
-                    id=f"{self.id}_thermostat_enable",
-                    name=f'{self.name} ENABLE [%s]',
-                    type='Switch',
-                    icon='heatingt',
-                    groups=self.get_groups(type='thermostat_enable'),
-                    broker=self.config['mqtt_broker_id'],
-                    channel_id=f'{self.id}:thermostat_enable',
-                    sitemap_type='Switch',
-                )
-            )
-            items.append(
-                MQTT_Item(
-                    id=f"{self.id}_local_temperature_calibration",
-                    name=f'{self.name} CAL [%.0f %unit%]',
-                    type='Number:Temperature',
-                    icon='heatingt',
-                    groups=self.get_groups(type='local_temperature_calibration'),
-                    broker=self.config['mqtt_broker_id'],
-                    channel_id=f'{self.id}:local_temperature_calibration',
-                    sitemap_type='Setpoint',
-                )
-            )
-
-        # Battery control
-        if self.has_tag_any('battery', 'battery_low', 'battery_voltage'):
-            items.append(
-                MQTT_Item(
-                    id=f"{self.id}_lowbatt",
-                    name=f'{self.name} BAT [MAP(codegen-lowbat.map):%s]',
-                    type='Switch',
-                    icon='lowbattery',
-                    groups=self.get_groups(type='lowbattery'),
-                    broker=self.config['mqtt_broker_id'],
-                    channel_id=f'{self.id}:battery_low',
-                    sitemap_type='Text',
-                )
-            )
-
-        # Common Zigbee channels
-        items.append(
-            MQTT_Item(
-                id=f"{self.id}_ota",
-                name=f'{self.name} OTA [%s]',
-                type='Switch',
-                icon='fire',
-                groups=self.get_groups(type='ota'),
-                broker=self.config['mqtt_broker_id'],
-                channel_id=f'{self.id}:ota',
-                sitemap_type='Text',
-            )
-        )
-        items.append(
-            MQTT_Item(
-                id=f"{self.id}_link",
-                name=f'{self.name} LINK [%d]',
-                type='Number:Dimensionless',
-                icon='linkz',
-                groups=self.get_groups(type='link'),
-                broker=self.config['mqtt_broker_id'],
-                channel_id=f'{self.id}:link',
-                sitemap_type='Text',
-            )
-        )
-
         return items
 
     def has_y2m(self):
@@ -1426,7 +1131,10 @@ class Device:
                     return True
         return False
 
-    def get_y2m_js(self, id=None, name=None, room=None, device_type=None, device_sub_type=None, device_options={}):
+    def get_y2m_js(self, id=None, name=None, room=None, device_type=None, device_sub_type=None,
+                   device_options: Optional[List[str]] = None):
+        # Options list is extended here, caller list is not changed
+        device_options = list(device_options or [])
         if not device_type and self.has_tag('lamp'):
             device_type = 'Light'
             if self.has_tag('ct'):
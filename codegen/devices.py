@@ -1,9 +1,10 @@
 #!/usr/bin/env python3
 
 # # Devices, used in this configuration
-from typing import Any
+from typing import Any, Dict
 
-from codegen.device import Device
+from codegen.device import Device, DeviceTypeChannels, DeviceTypeTags
+from codegen.plan import DeviceTypePlan
 
 class DEVICES:
     """
@@ -21,14 +22,44 @@ class DEVICES:
             * la : device reports Load Average
     """
 
-    def get_from_id(self, id: Str) -> Any:
+    def __init__(self) -> None:
+        # Compiled tags, channels and render plans per device type
+        self.types_tags: Dict[str, DeviceTypeTags] = {}
+        self.types_channels: Dict[str, DeviceTypeChannels] = {}
+        self.types_plans: Dict[str, DeviceTypePlan] = {}
+
+    def get_from_id(self, id: str) -> Any:
         return getattr(self, id)
 
+    def get_type_tags(self, id: str) -> DeviceTypeTags:
+        if id not in self.types_tags:
+            self.types_tags[id] = DeviceTypeTags(self.get_from_id(id))
+        return self.types_tags[id]
+
+    def get_type_channels(self, id: str) -> DeviceTypeChannels:
+        if id not in self.types_channels:
+            self.types_channels[id] = DeviceTypeChannels(self.get_from_id(id))
+        return self.types_channels[id]
+
+    def get_type_plan(self, id: str) -> DeviceTypePlan:
+        if id not in self.types_plans:
+            self.types_plans[id] = DeviceTypePlan(
+                self.get_from_id(id),
+                self.get_type_channels(id).simple_channels,
+            )
+        return self.types_plans[id]
+
     def get_device(self, device_config, global_config) -> Device:
         # Find device config from DEVICES object
         type_config = self.get_from_id(id=device_config['type'])
         # Create device class
-        device = Device(device_config, type_config)
+        device = Device(
+            device_config,
+            type_config,
+            self.get_type_tags(device_config['type']),
+            self.get_type_channels(device_config['type']),
+            self.get_type_plan(device_config['type']),
+        )
         device.set_global_config(global_config)
         return device
 
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+    Device-block-aware diff for generated files
+"""
+
+from difflib import SequenceMatcher
+import re
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Device header, see Device.get_comment():
+# // <name> (<address>)
+# // <device type name> / <device url>
+DEVICE_LABEL_RE = re.compile(r'^// .* \(([^()]*)\)$')
+# Sitemap frame is placed before device header
+SITEMAP_FRAME_PREFIX = 'Frame label='
+
+
+class Block:
+    """
+        Lines of one device (or lines outside devices, key is None)
+    """
+
+    def __init__(self, key: Optional[str], start: int) -> None:
+        self.key = key
+        # Unique in file: (key, occurrence of key), see split_blocks()
+        self.id: Tuple[Optional[str], int] = (key, 0)
+        self.start = start
+        self.lines: List[str] = list()
+
+    def is_same(self, other: 'Block') -> bool:
+        return self.lines == other.lines
+
+
+def split_blocks(lines: List[str]) -> List[Block]:
+    """
+        Split file lines on blocks by device header comments.
+        Lines before first device (preamble) and between devices are
+        added to previous block, file without devices is single block.
+    """
+    # Header lines: checked only for lines starting with comment
+    headers = [
+        (idx, label)
+        for idx, line in enumerate(lines[:-1])
+        if line.startswith('// ') and line.endswith((')\n', ')')) and lines[idx + 1].startswith('// ')
+        and (label := DEVICE_LABEL_RE.match(line.rstrip('\n')))
+    ]
+    blocks = [Block(None, 0)]
+    for idx, label in headers:
+        block = Block(label.group(1), idx)
+        # Sitemap: frame line belongs to device
+        if idx > blocks[-1].start and lines[idx - 1].startswith(SITEMAP_FRAME_PREFIX):
+            block.start -= 1
+        blocks.append(block)
+    for block, next_block in zip(blocks, blocks[1:]):
+        block.lines = lines[block.start:next_block.start]
+    blocks[-1].lines = lines[blocks[-1].start:]
+    # Same label may be used by several devices
+    occurrences: Dict[Optional[str], int] = dict()
+    for block in blocks:
+        block.id = (block.key, occurrences.get(block.key, 0))
+        occurrences[block.key] = block.id[1] + 1
+    return blocks
+
+
+def unified_hunks(a: List[str], b: List[str], a_start: int, b_start: int, n: int = 3) -> Iterator[str]:
+    """
+        Unified diff hunks with line numbers shifted by block offsets
+    """
+    for group in SequenceMatcher(None, a, b).get_grouped_opcodes(n):
+        i1, i2, j1, j2 = group[0][1], group[-1][2], group[0][3], group[-1][4]
+        yield f'@@ -{format_range(a_start + i1, i2 - i1)} +{format_range(b_start + j1, j2 - j1)} @@\n'
+        for tag, i1, i2, j1, j2 in group:
+            if tag == 'equal':
+                for line in a[i1:i2]:
+                    yield ' ' + line
+                continue
+            if tag in ('replace', 'delete'):
+                for line in a[i1:i2]:
+                    yield '-' + line
+            if tag in ('replace', 'insert'):
+                for line in b[j1:j2]:
+                    yield '+' + line
+
+
+def format_range(start: int, length: int) -> str:
+    """
+        Range in unified diff format (as in difflib)
+    """
+    beginning = start + 1
+    if length == 1:
+        return f'{beginning}'
+    if not length:
+        beginning -= 1
+    return f'{beginning},{length}'
+
+
+class BlockDiff:
+    """
+        Compares old and new file by device blocks.
+        Line diff runs only inside changed blocks.
+    """
+
+    def __init__(self, old_lines: List[str], new_lines: List[str]) -> None:
+        self.old_blocks = split_blocks(old_lines)
+        self.new_blocks = split_blocks(new_lines)
+        old_map: Dict[Tuple[Optional[str], int], Block] = {b.id: b for b in self.old_blocks}
+        new_map: Dict[Tuple[Optional[str], int], Block] = {b.id: b for b in self.new_blocks}
+
+        # Device keys (lines outside devices are not counted)
+        self.added: List[str] = [
+            b.key for b in self.new_blocks if b.key is not None and b.id not in old_map
+        ]
+        self.removed: List[str] = [
+            b.key for b in self.old_blocks if b.key is not None and b.id not in new_map
+        ]
+        self.changed: List[str] = [
+            b.key for b in self.new_blocks
+            if b.key is not None and b.id in old_map and not old_map[b.id].is_same(b)
+        ]
+        # Devices with changed position: not in longest common order of old and new file
+        old_order = [b.id for b in self.old_blocks if b.key is not None and b.id in new_map]
+        new_order = [b.id for b in self.new_blocks if b.key is not None and b.id in old_map]
+        kept = set()
+        for match in SequenceMatcher(None, old_order, new_order, autojunk=False).get_matching_blocks():
+            kept.update(new_order[match.b:match.b + match.size])
+        self._moved_ids = [block_id for block_id in new_order if block_id not in kept]
+        self.moved: List[str] = [block_id[0] for block_id in self._moved_ids]
+        self.other_changed = not old_map[(None, 0)].is_same(new_map[(None, 0)])
+        self._old_map = old_map
+        self._new_map = new_map
+
+    def is_changed(self) -> bool:
+        return bool(self.added or self.removed or self.changed or self.moved or self.other_changed)
+
+    def get_changed_blocks(self) -> Iterator[Tuple[Optional[Block], Optional[Block]]]:
+        """
+            Pairs (old, new) of changed blocks, in order of new file.
+            Removed blocks are returned at the end.
+        """
+        for block in self.new_blocks:
+            old = self._old_map.get(block.id, None)
+            if old is None:
+                yield None, block
+            elif not old.is_same(block):
+                yield old, block
+        for block in self.old_blocks:
+            if block.id not in self._new_map:
+                yield block, None
+
+    def get_moved_blocks(self) -> Iterator[Tuple[Block, Block]]:
+        """
+            Pairs (old, new) of moved blocks, in order of new file
+        """
+        for block_id in self._moved_ids:
+            yield self._old_map[block_id], self._new_map[block_id]
+
+    def unified(self, fromfile: str, tofile: str, n: int = 3) -> Iterator[str]:
+        """
+            Unified-like diff of changed blocks.
+            Moved block is displayed as removed from old position and added to new one
+        """
+        if not self.is_changed():
+            return
+        moved = set(self._moved_ids)
+        yield f'--- {fromfile}\n'
+        yield f'+++ {tofile}\n'
+        for old, new in self.get_changed_blocks():
+            if old is not None and new is not None and new.id in moved:
+                continue
+            if old is None:
+                yield f'@@ -{format_range(0, 0)} +{format_range(new.start, len(new.lines))} @@ added {new.key}\n'
+                for line in new.lines:
+                    yield '+' + line
+            elif new is None:
+                yield f'@@ -{format_range(old.start, len(old.lines))} +{format_range(0, 0)} @@ removed {old.key}\n'
+                for line in old.lines:
+                    yield '-' + line
+            else:
+                yield from unified_hunks(old.lines, new.lines, old.start, new.start, n)
+        for old, new in self.get_moved_blocks():
+            yield f'@@ -{format_range(old.start, len(old.lines))} +{format_range(0, 0)} @@ moved {old.key}\n'
+            for line in old.lines:
+                yield '-' + line
+            yield f'@@ -{format_range(0, 0)} +{format_range(new.start, len(new.lines))} @@ moved {new.key}\n'
+            for line in new.lines:
+                yield '+' + line
+
+    def changed_lines(self) -> Iterator[Tuple[str, str]]:
+        """
+            Only changed lines (no context): ('+' or '-', line)
+        """
+        for old, new in self.get_changed_blocks():
+            if old is None:
+                for line in new.lines:
+                    yield '+', line
+            elif new is None:
+                for line in old.lines:
+                    yield '-', line
+            else:
+                for tag, i1, i2, j1, j2 in SequenceMatcher(None, old.lines, new.lines).get_opcodes():
+                    if tag in ('replace', 'delete'):
+                        for line in old.lines[i1:i2]:
+                            yield '-', line
+                    if tag in ('replace', 'insert'):
+                        for line in new.lines[j1:j2]:
+                            yield '+', line
+
+
+def get_item_name(line: str) -> Optional[str]:
+    """
+        Item name from items file line: <type> <name> "<label>" ...
+    """
+    if line.startswith('//'):
+        return None
+    parts = line.split(None, 2)
+    if len(parts) < 2:
+        return None
+    return parts[1]
+
+
+def get_file_report(old_lines: Optional[List[str]], new_lines: Optional[List[str]], items: bool = False) -> Dict:
+    """
+        Change counters of file (without diff text).
+        Old lines are None for created file, new lines are None for removed file
+    """
+    diff = BlockDiff(old_lines or [], new_lines or [])
+    lines_added = 0
+    lines_removed = 0
+    item_names = set()
+    for sign, line in diff.changed_lines():
+        if sign == '+':
+            lines_added += 1
+        else:
+            lines_removed += 1
+        if items:
+            name = get_item_name(line)
+            if name:
+                item_names.add(name)
+    return {
+        'status': 'created' if old_lines is None else 'removed' if new_lines is None else 'changed',
+        'lines_added': lines_added,
+        'lines_removed': lines_removed,
+        'devices_added': len(diff.added),
+        'devices_removed': len(diff.removed),
+        'devices_changed': len(diff.changed),
+        'devices_moved': len(diff.moved),
+        'items': sorted(item_names),
+    }
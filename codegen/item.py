@@ -1,77 +1,112 @@
-from typing import List
+import functools
+import sys
+from typing import List, Optional, Tuple
+
+# Interned groups lists are shared by many items. Cache is bounded (long watch sessions,
+# library use) and thread-safe, evicted lists are interned again when used
+GROUPS_INTERN_SIZE = 4096
+
+
+@functools.lru_cache(maxsize=GROUPS_INTERN_SIZE)
+def intern_groups_tuple(groups: Tuple[str, ...]) -> Tuple[str, ...]:
+    return tuple(sys.intern(group) for group in groups)
+
+
+def intern_groups(groups) -> Tuple[str, ...]:
+    return intern_groups_tuple(tuple(groups))
+
+
+def intern_optional(value: Optional[str]) -> Optional[str]:
+    if value is None:
+        return None
+    return sys.intern(value)
+
 
 class Item:
-    def __init__(self) -> None:
-        self.conf_str = list()
-        self.gen_sitemap_items_str = list()
-        pass
+    """
+        Item record, config is rendered only when requested
+    """
+    __slots__ = ('id', 'name', 'type', 'icon', 'groups')
+
+    def __init__(self,
+        id: str = None,
+        name: str = None,
+        type: str = None,
+        icon: str = None,
+        groups: List[str] = (),
+    ) -> None:
+        self.id = id
+        self.name = name
+        self.type = intern_optional(type)
+        self.icon = intern_optional(icon)
+        self.groups = intern_groups(groups)
 
-    def get_config(self) -> List[Str]:
+    def get_item_conf(self) -> List[str]:
+        """
+            Common part of item config: type, name, label, icon and groups
+        """
+        item_conf = list()
+
+        item_conf.append(self.type)
+        item_conf.append(self.id)
+        item_conf.append(f"\"{self.name}\"")
+        if self.icon:
+            item_conf.append(f"<{self.icon}>")
+        if self.groups:
+            item_conf.append("(" + ",".join(self.groups) + ")")
+        return item_conf
+
+    def get_config(self) -> List[str]:
         """
             Return strings list to place in 'gen.items'
         """
-        return self.conf_str
+        return []
 
-    def get_sitemap_config(self) -> List[Str]:
+    def get_sitemap_config(self) -> List[str]:
         """
             Return strings to place in 'gen.sitemap'
         """
-        return self.gen_sitemap_items_str
+        return []
 
 class Generic_Item(Item):
-    def __init__(self,
-        id: Str,
-        name: Str,
-        type: Str,
-        icon: Str = None,
-        groups: List[str] = list(),
-    ) -> None:
-        Item.__init__(self)
-        item_conf = list()
-
-        item_conf.append(type)
-        item_conf.append(id)
-        item_conf.append(f"\"{name}\"")
-        if icon:
-            item_conf.append(f"<{icon}>")
-        if groups:
-            item_conf.append("(" + ",".join(groups) + ")")
+    __slots__ = ()
 
-        self.conf_str.append(" ".join(item_conf))
+    def get_config(self) -> List[str]:
+        return [" ".join(self.get_item_conf())]
 
 class MQTT_Item(Item):
+    __slots__ = ('broker', 'channel_id', 'expire', 'sitemap_type')
+
     def __init__(self,
-        id: Str,
-        name: Str,
-        type: Str,
-        broker: Str,
-        channel_id: Str,
-        groups: List[str] = list(),
-        expire: Str = None,
-        sitemap_type: Str = None,
-        icon: Str = None,
+        id: str,
+        name: str,
+        type: str,
+        broker: str,
+        channel_id: str,
+        groups: List[str] = (),
+        expire: str = None,
+        sitemap_type: str = None,
+        icon: str = None,
     ) -> None:
-        Item.__init__(self)
-        item_conf = list()
+        Item.__init__(self, id=id, name=name, type=type, icon=icon, groups=groups)
+        self.broker = sys.intern(str(broker))
+        self.channel_id = channel_id
+        self.expire = intern_optional(expire)
+        self.sitemap_type = intern_optional(sitemap_type)
 
-        item_conf.append(type)
-        item_conf.append(id)
-        item_conf.append(f"\"{name}\"")
-        if icon:
-            item_conf.append(f"<{icon}>")
-        if groups:
-            item_conf.append("(" + ",".join(groups) + ")")
+    def get_config(self) -> List[str]:
+        item_conf = self.get_item_conf()
 
         item_channel = list()
-        item_channel.append(f"channel=\"mqtt:topic:{broker}:{channel_id}\"")
+        item_channel.append(f"channel=\"mqtt:topic:{self.broker}:{self.channel_id}\"")
 
-        if expire:
-            item_channel.append(f"expire=\"{expire}\" [ignoreStateUpdates=\"true\"]")
+        if self.expire:
+            item_channel.append(f"expire=\"{self.expire}\" [ignoreStateUpdates=\"true\"]")
         item_conf.append("{" + ", ".join(item_channel) + "}")
 
-        self.conf_str.append(" ".join(item_conf))
+        return [" ".join(item_conf)]
 
-        if sitemap_type:
-            self.gen_sitemap_items_str.append(
-                f"{sitemap_type} item={id}"
-            )
+    def get_sitemap_config(self) -> List[str]:
+        if not self.sitemap_type:
+            return []
+        return [f"{self.sitemap_type} item={self.id}"]
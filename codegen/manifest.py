@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+    Run manifest: hashes of inputs and produced outputs, stored next to outputs
+"""
+
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+# Manifest file name, in openHAB path
+MANIFEST_FILE = '.codegen-manifest.json'
+MANIFEST_VERSION = 1
+
+
+def get_file_state(file: Path, old: Optional[Dict] = None, sha256: Optional[str] = None) -> Optional[Dict]:
+    """
+        Size, mtime and content hash of file (None, if it does not exist).
+        Hash is taken from old state, if file has same size and mtime,
+        or is given (file was just written)
+    """
+    try:
+        st = file.stat()
+    except FileNotFoundError:
+        return None
+    if old and old['size'] == st.st_size and old['mtime_ns'] == st.st_mtime_ns:
+        return old
+    return {
+        'size': st.st_size,
+        'mtime_ns': st.st_mtime_ns,
+        'sha256': sha256 or hashlib.sha256(file.read_bytes()).hexdigest(),
+    }
+
+
+def is_same_content(old: Optional[Dict], new: Optional[Dict]) -> bool:
+    if old is None or new is None:
+        return old is new
+    return old['sha256'] == new['sha256']
+
+
+class Manifest:
+    """
+        Inputs (config files, codegen sources, templates and transforms, options)
+        and outputs of last successful run.
+        Run is not needed, if inputs are not changed and outputs are not touched since.
+        Outputs, which are not produced anymore, are known to be safe to remove
+    """
+
+    def __init__(self, file: Path) -> None:
+        self.file = file
+        self.old: Dict[str, Any] = {'options': None, 'inputs': {}, 'outputs': {}}
+        self.options = None
+        self.inputs: Dict[str, Optional[Dict]] = {}
+        self.outputs: Dict[str, Optional[str]] = {}
+        self.removed: Set[str] = set()
+        try:
+            with open(file, 'r') as f:
+                data = json.load(f)
+            if data.get('version') == MANIFEST_VERSION:
+                self.old = data
+        except FileNotFoundError:
+            pass
+        except ValueError:
+            logging.warning("Manifest %s is broken, ignoring", str(file))
+
+    def set_inputs(self, files: Iterable[Path], options: Dict) -> None:
+        # Options are compared as stored in JSON
+        self.options = json.loads(json.dumps(options, sort_keys=True, default=str))
+        old_inputs = self.old['inputs']
+        self.inputs = {
+            str(file): get_file_state(file, old_inputs.get(str(file), None))
+            for file in (Path(f).absolute() for f in files)
+        }
+
+    def is_up_to_date(self) -> bool:
+        """
+            Inputs are same as in last run and outputs are not changed
+        """
+        if not self.old['outputs'] or self.options != self.old['options']:
+            return False
+        old_inputs = self.old['inputs']
+        if self.inputs.keys() != old_inputs.keys():
+            return False
+        for name, state in self.inputs.items():
+            if not is_same_content(old_inputs[name], state):
+                return False
+        for name, old in self.old['outputs'].items():
+            if old is None or not is_same_content(old, get_file_state(Path(name), old)):
+                return False
+        return True
+
+    def add_output(self, file: Path, sha256: Optional[str] = None) -> None:
+        """
+            Output produced in this run (hash is taken from file, if not set)
+        """
+        self.outputs[str(file.absolute())] = sha256
+
+    def add_removed(self, file: Path) -> None:
+        """
+            Output removed in this run (not stale anymore)
+        """
+        self.removed.add(str(file.absolute()))
+
+    def get_stale(self) -> List[Path]:
+        """
+            Outputs of last run, not produced in this run.
+            Files changed since last run (not by codegen) are not included
+        """
+        stale = list()
+        for name, old in sorted(self.old['outputs'].items()):
+            if name in self.outputs or name in self.removed:
+                continue
+            file = Path(name)
+            if file.is_symlink() or not file.is_file():
+                # Removed, or replaced by user (e.g. with directory)
+                continue
+            state = get_file_state(file, old)
+            if not is_same_content(old, state):
+                logging.warning("File %s is not generated anymore, but was changed, keeping it", name)
+                continue
+            stale.append(file)
+        return stale
+
+    def save(self) -> None:
+        """
+            Store inputs and outputs of this run
+        """
+        outputs = {
+            name: get_file_state(Path(name), sha256=sha256)
+            for name, sha256 in self.outputs.items()
+        }
+        data = {
+            'version': MANIFEST_VERSION,
+            'options': self.options,
+            'inputs': self.inputs,
+            'outputs': outputs,
+        }
+        self.file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.file.with_name(self.file.name + '.tmp')
+        with open(tmp_file, 'w') as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+        os.replace(tmp_file, self.file)
+        self.old = data
+        self.outputs = dict()
+        self.removed = set()
@@ -0,0 +1,489 @@
+#!/usr/bin/env python3
+"""
+    Render plans: Zigbee things and items of device type, compiled once
+"""
+
+import json
+import operator
+import re
+import sys
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from codegen.item import intern_groups
+from codegen.thing import quote_arg
+
+# Device values, substituted into plan templates
+PLAN_PARAMS = (
+    'state_topic',
+    'command_topic',
+    'channel_id',
+    'transition_sw',
+    'transition_brightness',
+    'expire_sec',
+    'brightness_min',
+    'brightness_max',
+    'ct_min',
+    'ct_max',
+)
+PLAN_PARAM_RE = re.compile(r'\{(' + '|'.join(PLAN_PARAMS) + r')\}')
+
+
+def get_channel_type(item: dict) -> str:
+    """
+        Thing channel type for item type
+    """
+    item_type = item['type']
+    if 'Number' in item_type: return 'number'
+    if 'Switch' in item_type: return 'switch'
+    if 'Contact' in item_type: return 'contact'
+    return 'string'
+
+
+class PlanValue:
+    """
+        Argument template, compiled to render function of parameters.
+        Template of single parameter gives its value as is (numbers are not quoted)
+    """
+
+    __slots__ = ('template', 'render')
+
+    def __init__(self, template: str) -> None:
+        self.template = template
+        # Split result: literals at even positions, parameters at odd ones
+        parts = PLAN_PARAM_RE.split(template)
+        if len(parts) == 3 and parts[0] == parts[2] == '':
+            self.render = operator.itemgetter(parts[1])
+        else:
+            # Literal braces are escaped, parameters are formatted as in f-string
+            self.render = ''.join(
+                part.replace('{', '{{').replace('}', '}}') if i % 2 == 0 else '{' + part + '}'
+                for i, part in enumerate(parts)
+            ).format_map
+
+    def __reduce__(self):
+        # Bound methods of templates are not pickled: compile again
+        return (PlanValue, (self.template,))
+
+
+class ChannelSpec(NamedTuple):
+    """
+        Thing channel of plan: arguments are (key, value, template or None).
+        Config line is compiled to format string of channel ID and template values
+    """
+    type: str
+    id: PlanValue
+    args: Tuple[Tuple[str, Any, Optional[PlanValue]], ...]
+    templates: Tuple[PlanValue, ...]
+    line: str
+
+    @classmethod
+    def compile(cls, type: str, id: str, args: dict) -> 'ChannelSpec':
+        args = tuple(
+            (k, v, PlanValue(v) if isinstance(v, str) and PLAN_PARAM_RE.search(v) else None)
+            for k, v in args.items()
+        )
+        args_str = [
+            f'{k}={{}}' if t else f'{k}={quote_arg(v)}'.replace('{', '{{').replace('}', '}}')
+            for k, v, t in args
+        ]
+        return cls(
+            type=sys.intern(type),
+            id=PlanValue(id),
+            args=args,
+            templates=tuple(t for _, _, t in args if t),
+            line=f"\t\tType {type} : {{}} [{', '.join(args_str)}]",
+        )
+
+    def get_values(self, params: Dict[str, Any]) -> Tuple[Any, ...]:
+        return tuple([t.render(params) for t in self.templates])
+
+
+class PlanThingChannel:
+    """
+        Thing channel record of plan: only values of device are stored
+    """
+    __slots__ = ('spec', 'id', 'values')
+
+    def __init__(self, spec: ChannelSpec, id: str, values: Tuple[Any, ...]) -> None:
+        self.spec = spec
+        self.id = id
+        self.values = values
+
+    @property
+    def type(self) -> str:
+        return self.spec.type
+
+    @property
+    def args(self) -> Tuple[Tuple[str, Any], ...]:
+        values = iter(self.values)
+        return tuple((k, next(values) if t else v) for k, v, t in self.spec.args)
+
+    def get_config(self) -> List[str]:
+        return [self.spec.line.format(self.id, *[quote_arg(v) for v in self.values])]
+
+
+class ItemSpec(NamedTuple):
+    """
+        Item of plan: ID and channel are suffixes of device ID, label follows device name
+    """
+    id: str
+    label: str
+    type: str
+    channel: str
+    group: str
+    icon: Optional[str] = None
+    # Icon is default, device icon is used if set
+    device_icon: bool = False
+    sitemap_type: Optional[str] = None
+    # Groups of device without custom groups
+    auto_groups: Tuple[str, ...] = ()
+
+
+class PlanBlock(NamedTuple):
+    """
+        Specs rendered together: once, or for each device channel.
+        Block is skipped if device check 'when' (method name) is false
+    """
+    specs: Tuple[Any, ...]
+    per_channel: bool = False
+    when: Optional[str] = None
+
+
+class DeviceTypePlan:
+    """
+        Zigbee things channels and items of device type.
+        Type tags are checked once here: device render is substitution of its values only
+    """
+
+    __slots__ = ('things', 'items')
+
+    def __init__(self, config_type, simple_channels: Tuple[dict, ...] = ()) -> None:
+        self.things: Tuple[PlanBlock, ...] = ()
+        self.items: Tuple[PlanBlock, ...] = ()
+        if 'zigbee' in config_type['types']:
+            self.things = self.compile_blocks(self.get_things_specs(config_type, simple_channels))
+            self.items = self.compile_blocks(self.get_items_specs(config_type))
+
+    @staticmethod
+    def compile_blocks(specs: List[Tuple[Any, Optional[str], Optional[str]]]) -> Tuple[PlanBlock, ...]:
+        """
+            Group adjacent specs with same mode into blocks
+        """
+        blocks = list()
+        for spec, channels_group, when in specs:
+            if blocks and blocks[-1][1:] == [channels_group, when]:
+                blocks[-1][0].append(spec)
+            else:
+                blocks.append([[spec], channels_group, when])
+        return tuple(
+            PlanBlock(tuple(specs), channels_group is not None, when)
+            for specs, channels_group, when in blocks
+        )
+
+    @staticmethod
+    def get_things_specs(config_type,
+                         simple_channels: Tuple[dict, ...]) -> List[Tuple[ChannelSpec, Optional[str], Optional[str]]]:
+        """
+            Channels specs in Thing order: (spec, channels group, when).
+            Specs of channels group are repeated together for each device channel
+        """
+        tags = frozenset(config_type['types'])
+        specs = list()
+
+        def add(type: str, id: str, args: dict, per_channel: Optional[str] = None, when: Optional[str] = None) -> None:
+            specs.append((ChannelSpec.compile(type, id, args), per_channel, when))
+
+        state = '{state_topic}'
+        command = '{command_topic}'
+
+        # Device has switch (Lamp, Wall socket)
+        if tags & {'lamp', 'plug'}:
+            add('switch', 'state', {
+                'stateTopic': state,
+                'commandTopic': command,
+                'transformationPattern': 'JSONPATH:$.state',
+                'transformationPatternOut': 'JS:codegen-cmd-value.js?f=state&t={transition_sw}&exp={expire_sec}',
+            })
+        # Device has switch (multi-gang) option
+        if 'plug_mt' in tags:
+            add('switch', 'state_{channel_id}', {
+                'stateTopic': state,
+                'commandTopic': command,
+                'transformationPattern': 'JSONPATH:$.state_{channel_id}',
+                'formatBeforePublish': json.dumps({'state_{channel_id}': "%s"})
+            }, per_channel='plug_mt')
+
+        # Device has curtain/blinds (single-gang) option
+        if 'blinds' in tags:
+            add('string', 'moving', {
+                'stateTopic': state,
+                'transformationPattern': 'JSONPATH:$.moving',
+            })
+            add('string', 'state', {
+                'stateTopic': state,
+                'commandTopic': command,
+                'transformationPattern': 'JSONPATH:$.state',
+                'formatBeforePublish': json.dumps({'state': "%s"})
+            })
+            add('dimmer', 'position', {
+                'stateTopic': state,
+                'commandTopic': command,
+                'transformationPattern': 'JS:codegen-rpos.js?channel=position',
+                'transformationPatternOut': 'JS:codegen-cmd-rpos.js?channel=position',
+            })
+            add('switch', 'calibration', {
+                'stateTopic': state,
+                'commandTopic': command,
+                'transformationPattern': 'JSONPATH:$.calibration',
+                'formatBeforePublish': json.dumps({'calibration': "%s"})
+            })
+        # Device has curtain/blinds (multi-gang) option
+        if 'blinds_mt' in tags:
+            add('string', 'moving_{channel_id}', {
+                'stateTopic': state,
+                'transformationPattern': 'JSONPATH:$.moving_{channel_id}',
+            }, per_channel='blinds_mt')
+            add('string', 'state_{channel_id}', {
+                'stateTopic': state,
+                'commandTopic': command,
+                'transformationPattern': 'JSONPATH:$.state_{channel_id}',
+                'formatBeforePublish': json.dumps({'state_{channel_id}': "%s"})
+            }, per_channel='blinds_mt')
+            add('dimmer', 'position_{channel_id}', {
+                'stateTopic': state,
+                'commandTopic': command,
+                'transformationPattern': 'JS:codegen-rpos.js?channel=position_{channel_id}',
+                'transformationPatternOut': 'JS:codegen-cmd-rpos.js?channel=position_{channel_id}',
+            }, per_channel='blinds_mt')
+            add('switch', 'calibration_{channel_id}', {
+                'stateTopic': state,
+                'commandTopic': command,
+                'transformationPattern': 'JSONPATH:$.calibration_{channel_id}',
+                'formatBeforePublish': json.dumps({'calibration_{channel_id}': "%s"})
+            }, per_channel='blinds_mt')
+        # Lamps have dimmer
+        if 'lamp' in tags:
+            # Normal control point
+            add('dimmer', 'dim', {
+                'stateTopic': state,
+                'commandTopic': command,
+                'transformationPattern': 'REGEX:(.*"brightness".*)∩JS:codegen-brightness.js',
+                'transformationPatternOut': 'JS:codegen-cmd-value.js?f=brightness&t={transition_brightness}&exp=0',
+                'min': '{brightness_min}',  # Dedvice type could change that
+                'max': '{brightness_max}',
+            })
+            # Control point for fast change - for dimmers
+            add('dimmer', 'dim_fast', {
+                'stateTopic': state,
+                'commandTopic': command,
+                'transformationPattern': 'REGEX:(.*"brightness".*)∩JS:codegen-brightness.js',
+                'transformationPatternOut': 'JS:codegen-cmd-value.js?f=brightness&t=0&exp=0',
+                'min': '{brightness_min}',  # Dedvice type could change that
+                'max': '{brightness_max}',
+            })
+        # Lamps have color temp?
+        if 'ct' in tags:
+            add('dimmer', 'ct', {
+                'stateTopic': state,
+                'commandTopic': command,
+                'transformationPattern': 'REGEX:(.*"color_temp".*)∩JSONPATH:$.color_temp',
+                'transformationPatternOut': 'JS:codegen-cmd-value.js?f=color_temp&t=3&exp=0',
+                'min': '{ct_min}',
+                'max': '{ct_max}',
+            })
+        # Lamps have color?
+        if 'color' in tags:
+            add('color', 'color', {
+                'commandTopic': command,
+                'transformationPatternOut': 'JS:codegen-cmd-color_xy.js',
+            })
+            add('string', 'color_mode', {
+                'stateTopic': state,
+                'transformationPattern': 'REGEX:(.*"color_mode".*)∩JSONPATH:$.color_mode',
+            })
+        # Device is remote
+        if 'remote' in tags:
+            add('string', 'action', {
+                'stateTopic': state,
+                'commandTopic': command,
+                'transformationPattern': 'REGEX:(.*"action".*)∩JSONPATH:$.action',
+                'trigger': 'true',
+            })
+            # Simulate brightness? Saved brightness (absolute value)
+            add('dimmer', 'dim', {
+                'stateTopic': state,
+                'transformationPattern': 'REGEX:(.*"action_brightness_delta".*)∩JSONPATH:$.brightness',
+                'min': 1,
+                'max': 255,
+            }, when='is_simulated_brightness')
+            # Delta brightness (relative value)
+            add('number', 'action_dim', {
+                'stateTopic': state,
+                'transformationPattern': 'REGEX:(.*"action_brightness_delta".*)∩JSONPATH:$.action_brightness_delta',
+                'trigger': 'true',
+            }, when='is_simulated_brightness')
+        # Device is TRV
+        if 'thermostat' in tags:
+            add('number', 'thermostat', {
+                'stateTopic': state,
+                'commandTopic': command,
+                'transformationPattern': 'REGEX:(.*"current_heating_setpoint".*)∩JSONPATH:$.current_heating_setpoint',
+                'transformationPatternOut': 'JS:codegen-cmd-float.js?f=current_heating_setpoint',
+                'unit': 'C°',
+            })
+            add('string', 'thermostat_mode', {
+                'stateTopic': state,
+                'commandTopic': command,
+                'transformationPattern': 'REGEX:(.*"system_mode".*)∩JSONPATH:$.system_mode',
+                'formatBeforePublish': json.dumps({'system_mode': '%s'})
+            })
+            add('string', 'thermostat_preset', {
+                'stateTopic': state,
+                'commandTopic': command,
+                'transformationPattern': 'REGEX:(.*"preset".*)∩JSONPATH:$.preset',
+                'formatBeforePublish': json.dumps({'preset': '%s'})
+            })
+            # Command topic depends on control mode
+            control_mode = config_type.get('thermostat_control_mode', 'system_mode')
+            control_mode_js = ''
+            if control_mode != 'system_mode':
+                control_mode_js = '-' + control_mode
+            add('switch', 'thermostat_enable', {
+                'stateTopic': state,
+                'commandTopic': command,
+                'transformationPattern':
+                    f'REGEX:(.*"system_mode".*)∩JS:codegen-thermostat-enable{control_mode_js}.js',
+                'transformationPatternOut': f'JS:codegen-cmd-thermostat-enable{control_mode_js}.js',
+            })
+            # Local calibration value
+            add('string', 'local_temperature_calibration', {
+                'stateTopic': state,
+                'commandTopic': command,
+                'transformationPattern':
+                    'REGEX:(.*"local_temperature_calibration".*)∩JSONPATH:$.local_temperature_calibration',
+                'transformationPatternOut': 'JS:codegen-cmd-float.js?f=local_temperature_calibration',
+                'unit': 'C°',
+            })
+
+        mqtt_remap = config_type.get('mqtt_remap', {})
+        for metric in simple_channels:
+            # Topic ID to be parsed from MQTT
+            topic_item_id = metric.get('topic_id', metric["id"])
+            # Remap topic ID?
+            topic_item_id = mqtt_remap.get(topic_item_id, topic_item_id)
+            args = {
+                'stateTopic': state,
+                'transformationPattern': f'REGEX:(.*"{topic_item_id}".*)∩JSONPATH:$.{topic_item_id}',
+            }
+            if 'unit' in metric:
+                args['unit'] = metric['unit']
+            if 'channel_args' in metric:
+                args = args | metric['channel_args']
+            add(get_channel_type(metric), metric['id'], args)
+
+        activity = {
+            'stateTopic': state,
+            'transformationPattern': "JS:codegen-activity.js",
+        }
+        # Monitoring?
+        if 'activity' in tags:
+            add('datetime', 'activity', activity)
+
+        # Battery control
+        if 'battery' in tags:
+            add('switch', 'battery_low', {
+                'stateTopic': state,
+                'transformationPattern': 'REGEX:(.*"battery".*)∩JS:codegen-lowbat.js',
+            })
+        elif 'battery_low' in tags:
+            add('switch', 'battery_low', {
+                'stateTopic': state,
+                'transformationPattern': 'REGEX:(.*"battery_low".*)∩JSONPATH:$.battery_low',
+                'on': 'true',
+                'off': 'false',
+            })
+
+        # If device reports battery voltage, we can decide
+        if 'battery_voltage' in tags:
+            batt_type = config_type['batt_type']
+            add('switch', 'battery_low', {
+                'stateTopic': state,
+                'transformationPattern': f'REGEX:(.*"battery".*)∩S:codegen-lowbat-{batt_type}.js',
+                'unit': 'mV',
+            })
+
+        # Zigbee channels
+        add('number', 'link', {
+            'stateTopic': state,
+            'transformationPattern': 'REGEX:(.*"linkquality".*)∩JSONPATH:$.linkquality',
+        })
+        add('switch', 'ota', {
+            'stateTopic': state,
+            'transformationPattern': 'REGEX:(.*"update_available".*)∩JSONPATH:$.update_available',
+            'on': 'true',
+            'off': 'false',
+        })
+
+        # Monitoring?
+        if 'activity' in tags:
+            add('datetime', 'activity', activity)
+
+        return specs
+
+    @staticmethod
+    def get_items_specs(config_type) -> List[Tuple[ItemSpec, Optional[str], Optional[str]]]:
+        """
+            Items specs in Items order: (spec, channels group, when)
+        """
+        tags = frozenset(config_type['types'])
+        specs = list()
+
+        def add(spec: ItemSpec, when: Optional[str] = None) -> None:
+            spec = spec._replace(auto_groups=intern_groups(['g_all_' + spec.group]))
+            specs.append((spec, None, when))
+
+        # All zigbee lamps have dimmer
+        if 'lamp' in tags:
+            # Normal (with transition)
+            add(ItemSpec('dim', 'DIM [%d %%]', 'Dimmer', 'dim', 'dim', 'light', True, 'Slider'))
+            # Fast control (for dimmers)
+            add(ItemSpec('dim_fast', 'DIM-F [%d %%]', 'Dimmer', 'dim_fast', 'dim_fast'))
+
+        # Some zigbee lamps have ct
+        if 'ct' in tags:
+            add(ItemSpec('ct', 'CT [JS(codegen-mired.js): %s]', 'Dimmer', 'ct', 'ct', 'light', True, 'Slider'))
+            # Rules to apply CT: see Device.get_rules()
+
+        # Some zigbee lamps have color
+        if 'color' in tags:
+            add(ItemSpec('color', 'Color', 'Color', 'color', 'color', 'colorwheel', False, 'Colorpicker'))
+            add(ItemSpec('color_mode', 'Color mode', 'String', 'color_mode', 'color_mode', 'colorwheel', False, 'Text'))
+
+        # Simulate brightness?
+        if 'remote' in tags:
+            add(ItemSpec('dim', 'DIM [%d %%]', 'Dimmer', 'dim', 'dim', 'light', True, 'Text'),
+                when='is_simulated_brightness')
+
+        if 'thermostat' in tags:
+            add(ItemSpec('thermostat', 'SET [%.0f %unit%]', 'Number:Temperature', 'thermostat', 'thermostat',
+                         'heatingt', False, 'Setpoint'))
+            add(ItemSpec('thermostat_mode', 'MODE [%s]', 'String', 'thermostat_mode', 'thermostat_mode',
+                         'heatingt', False, 'Text'))
+            add(ItemSpec('thermostat_preset', 'PRESET [%s]', 'String', 'thermostat_preset', 'thermostat_preset',
+                         'heatingt', False, 'Text'))
+            add(ItemSpec('thermostat_enable', 'ENABLE [%s]', 'Switch', 'thermostat_enable', 'thermostat_enable',
+                         'heatingt', False, 'Switch'))
+            add(ItemSpec('local_temperature_calibration', 'CAL [%.0f %unit%]', 'Number:Temperature',
+                         'local_temperature_calibration', 'local_temperature_calibration',
+                         'heatingt', False, 'Setpoint'))
+
+        # Battery control
+        if tags & {'battery', 'battery_low', 'battery_voltage'}:
+            add(ItemSpec('lowbatt', 'BAT [MAP(codegen-lowbat.map):%s]', 'Switch', 'battery_low', 'lowbattery',
+                         'lowbattery', False, 'Text'))
+
+        # Common Zigbee channels
+        add(ItemSpec('ota', 'OTA [%s]', 'Switch', 'ota', 'ota', 'fire', False, 'Text'))
+        add(ItemSpec('link', 'LINK [%d]', 'Number:Dimensionless', 'link', 'link', 'linkz', False, 'Text'))
+
+        return specs
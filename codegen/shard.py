@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+    Split generated things/items/rules on several files (shards)
+"""
+
+import hashlib
+import re
+from typing import Optional, Tuple
+
+from codegen.device import Device
+
+SHARD_MODES = ['config', 'room', 'hash']
+
+# Devices without y2m room
+SHARD_NO_ROOM = 'noroom'
+
+
+def parse_shard_mode(mode: Optional[str]) -> Tuple[Optional[str], int]:
+    """
+        Parse shard option: 'config', 'room' or 'hash:<buckets>'
+    """
+    if not mode or mode == 'none':
+        return None, 0
+    name, _, arg = mode.partition(':')
+    if name not in SHARD_MODES:
+        raise ValueError(f"Unknown shard mode {mode}, expected one of: {', '.join(SHARD_MODES)}")
+    if name == 'hash':
+        if not arg.isdigit() or int(arg) < 1:
+            raise ValueError(f"Shard mode {mode}: expected number of buckets (hash:<N>)")
+        return name, int(arg)
+    return name, 0
+
+
+def get_device_room(device: Device) -> Optional[str]:
+    """
+        y2m room of device (or of first channel having it)
+    """
+    if device.y2m.get('room', None):
+        return device.y2m['room']
+    for _, channel in device.channels.items():
+        room = channel.get('y2m', {}).get('room', None)
+        if room:
+            return room
+    return None
+
+
+def get_device_shard(mode: str, buckets: int, config_id: str, device: Device) -> str:
+    """
+        Shard name for device, stable between runs
+    """
+    if mode == 'config':
+        shard = config_id
+    elif mode == 'room':
+        shard = get_device_room(device) or SHARD_NO_ROOM
+    else:
+        bucket = int(hashlib.sha1(device.get_id().encode()).hexdigest(), 16) % buckets
+        shard = str(bucket).zfill(len(str(buckets - 1)))
+    # Shard name is used in file name
+    return re.sub(r'[^A-Za-z0-9_-]', '_', shard)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+    Disk-backed sequences for streaming mode
+"""
+
+import math
+import pickle
+import tempfile
+from typing import Any, Iterator, Optional, Set, Tuple
+
+from codegen.device import DeviceRender
+
+
+class RenderSpool:
+    """
+        Rendered devices, spilled to temporary file.
+        Can be iterated many times, only one render is kept in memory
+    """
+
+    def __init__(self) -> None:
+        self.file = tempfile.TemporaryFile()
+        self.count = 0
+
+    def append(self, render: DeviceRender) -> None:
+        self.file.seek(0, 2)
+        pickle.dump(tuple(render), self.file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.count += 1
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self) -> Iterator[DeviceRender]:
+        # Each iterator has own position: spool may be read by several generators
+        offset = 0
+        for _ in range(self.count):
+            self.file.seek(offset)
+            render = DeviceRender(*pickle.load(self.file))
+            offset = self.file.tell()
+            yield render
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def get_number_sort_key(value) -> str:
+    """
+        Text, which is sorted as number value: sign, number of digits and digits of integer part
+        (complemented for negative values), then exact digits of fractional part
+    """
+    integer = math.floor(value)
+    digits = str(abs(integer))
+    if integer >= 0:
+        sort_key = f'p{len(digits):05d}{digits}'
+    else:
+        sort_key = f'n{99999 - len(digits):05d}' + digits.translate(str.maketrans('0123456789', '9876543210'))
+    if isinstance(value, float) and value != integer:
+        from decimal import Decimal
+        sort_key += str(Decimal(value) - integer)[2:]
+    return sort_key
+
+
+class SortedSpool:
+    """
+        Key-value records, spilled to temporary SQLite database
+        and read back in order of sorted(keys) (same keys: in order of adding),
+        as yaml.dump(sort_keys=True) does: string keys and number keys are sorted,
+        keys which can't be sorted together (e.g. strings and numbers) are kept in order of adding
+    """
+
+    def __init__(self) -> None:
+        import sqlite3
+        # Empty name: private temporary database on disk
+        self.db = sqlite3.connect('')
+        self.db.execute('CREATE TABLE records (key TEXT, value TEXT)')
+        # Kinds of added keys: 'str', 'number' or 'other' (not sorted)
+        self.kinds: Set[str] = set()
+
+    def add(self, key: Any, value: str) -> None:
+        if isinstance(key, str):
+            kind, sort_key = 'str', key
+        elif isinstance(key, int) or (isinstance(key, float) and math.isfinite(key)):
+            kind, sort_key = 'number', get_number_sort_key(key)
+        else:
+            kind, sort_key = 'other', None
+        self.kinds.add(kind)
+        self.db.execute('INSERT INTO records VALUES (?, ?)', (sort_key, value))
+
+    def __iter__(self) -> Iterator[Tuple[Optional[str], str]]:
+        # Text is compared as UTF-8 bytes, same as strings by code points
+        order = 'key, rowid' if len(self.kinds) == 1 and 'other' not in self.kinds else 'rowid'
+        return iter(self.db.execute(f'SELECT key, value FROM records ORDER BY {order}'))
+
+    def close(self) -> None:
+        self.db.close()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+    Run statistics: time of stages and counters
+"""
+
+import json
+import time
+from typing import Dict, List
+
+
+class StatsStage:
+    """
+        Context manager, adds wall and CPU time to stage
+    """
+
+    def __init__(self, stats: 'Stats', name: str) -> None:
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        return self
+
+    def __exit__(self, *args):
+        stage = self.stats.stages.setdefault(self.name, {'wall': 0.0, 'cpu': 0.0, 'calls': 0})
+        stage['wall'] += time.perf_counter() - self.wall
+        stage['cpu'] += time.process_time() - self.cpu
+        stage['calls'] += 1
+
+
+class Stats:
+    """
+        Collects time per stage (wall and CPU of main process)
+        and counters per config
+    """
+
+    COUNTERS = ['devices', 'things', 'channels', 'items', 'rules_lines']
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.stages: Dict[str, Dict] = dict()
+        self.counters: Dict[str, Dict[str, int]] = dict()
+
+    def stage(self, name: str) -> StatsStage:
+        return StatsStage(self, name)
+
+    def count(self, config_id: str, name: str, value: int = 1) -> None:
+        counters = self.counters.setdefault(config_id, {c: 0 for c in self.COUNTERS})
+        counters[name] = counters.get(name, 0) + value
+
+    def get_report(self) -> Dict:
+        return {
+            'stages': {
+                name: {
+                    'wall': round(stage['wall'], 6),
+                    'cpu': round(stage['cpu'], 6),
+                    'calls': stage['calls'],
+                }
+                for name, stage in self.stages.items()
+            },
+            'counters': self.counters,
+        }
+
+    def get_report_json(self) -> str:
+        return json.dumps(self.get_report(), indent=2)
+
+    def get_report_table(self) -> List[str]:
+        """
+            Human-readable report
+        """
+        lines = []
+        lines.append(f"{'Stage':<24} {'Wall, s':>10} {'CPU, s':>10} {'Calls':>6}")
+        for name, stage in self.stages.items():
+            lines.append(f"{name:<24} {stage['wall']:>10.3f} {stage['cpu']:>10.3f} {stage['calls']:>6}")
+        lines.append('')
+        lines.append(f"{'Config':<24}" + ''.join(f' {c:>11}' for c in self.COUNTERS))
+        totals = {c: 0 for c in self.COUNTERS}
+        for config_id, counters in self.counters.items():
+            lines.append(f"{config_id:<24}" + ''.join(f' {counters.get(c, 0):>11}' for c in self.COUNTERS))
+            for c in self.COUNTERS:
+                totals[c] += counters.get(c, 0)
+        lines.append(f"{'TOTAL':<24}" + ''.join(f' {totals[c]:>11}' for c in self.COUNTERS))
+        return lines
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+    Rules templates registry: package-relative, compiled once per process
+"""
+
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+# Rule templates are shipped with codegen (not resolved from cwd)
+TEMPLATES_PATH = Path(__file__).parent.parent / 'rules'
+
+# Separates devices in batch render output
+BATCH_SEPARATOR = '\x00'
+
+
+class Templates:
+    """
+        Jinja environment with compiled templates kept in memory
+        and optional bytecode cache on disk (shared between runs)
+    """
+
+    def __init__(self, path: Path = TEMPLATES_PATH, bytecode_cache: bool = False,
+                 bytecode_dir: Optional[Path] = None) -> None:
+        self.path = path
+        # Bytecode cache is in system temp dir, if directory is not set
+        self.bytecode_cache = bytecode_cache
+        self.bytecode_dir = bytecode_dir
+        self.environment = None
+        self.templates: Dict[str, Any] = dict()
+
+    def get_environment(self):
+        if self.environment is None:
+            # Jinja is imported only if some device has rules
+            import jinja2
+            bytecode_cache = None
+            if self.bytecode_cache:
+                try:
+                    bytecode_cache = jinja2.FileSystemBytecodeCache(
+                        directory=str(self.bytecode_dir) if self.bytecode_dir else None,
+                    )
+                except (OSError, RuntimeError) as e:
+                    logging.debug("Templates bytecode cache is disabled: %s", e)
+            self.environment = jinja2.Environment(
+                loader=jinja2.FileSystemLoader(str(self.path)),
+                bytecode_cache=bytecode_cache,
+                auto_reload=False,
+            )
+        return self.environment
+
+    def get_template(self, name: str):
+        if name not in self.templates:
+            self.templates[name] = self.get_environment().get_template(name)
+        return self.templates[name]
+
+    def render(self, name: str, item) -> List[str]:
+        """
+            Render template for one device, result is list of lines
+        """
+        return self.get_template(name).render(item=item).splitlines()
+
+    def render_batch(self, name: str, items: Sequence) -> List[List[str]]:
+        """
+            Render template for many devices in one template call,
+            result has lines for each device (same order)
+        """
+        if not items:
+            return []
+        batch_name = f'batch:{name}'
+        if batch_name not in self.templates:
+            self.templates[batch_name] = self.get_environment().from_string(
+                '{% for item in items %}{% include name %}' + BATCH_SEPARATOR + '{% endfor %}',
+                globals={'name': name},
+            )
+        output = self.templates[batch_name].render(items=items)
+        return [x.splitlines() for x in output.split(BATCH_SEPARATOR)[:-1]]
+
+
+_templates: Optional[Templates] = None
+
+
+def get_templates() -> Templates:
+    """
+        Shared templates registry of this process
+    """
+    global _templates
+    if _templates is None:
+        _templates = Templates()
+    return _templates
+
+
+def enable_bytecode_cache(bytecode_dir: Optional[Path] = None) -> None:
+    """
+        Keep compiled templates on disk for next runs (CLI).
+        Disabled by default: library calls have no filesystem side effects
+    """
+    templates = get_templates()
+    templates.bytecode_cache = True
+    templates.bytecode_dir = bytecode_dir
+    templates.environment = None
+    templates.templates = dict()
@@ -1,46 +1,80 @@
+import sys
 from typing import List
 
+
+def quote_arg(value):
+    """
+        Channel argument value: strings are quoted and escaped
+    """
+    if isinstance(value, str):
+        return '"' + value.replace('"', '\\"') + '"'
+    return value
+
+
 class Thing:
-    def __init__(self):
-        self.conf_str = list()
+    """
+        Thing record, config is rendered only when requested
+    """
+    __slots__ = ()
+
+    def get_uid(self) -> str:
+        return None
 
-    def get_config(self) -> List[Str]:
-        return self.conf_str
+    def get_channels_uids(self) -> List[str]:
+        return []
+
+    def get_config(self) -> List[str]:
+        return []
 
 
 class MQTT_ThingChannel:
+    __slots__ = ('type', 'id', 'args')
+
     def __init__(
             self,
-            type: Str,
-            id: Str,
+            type: str,
+            id: str,
             args,
         ) -> None:
-        args_str = list()
-        for k, v in args.items():
-            if isinstance(v, str):
-                v = v.translate(str.maketrans({'"': '\\"'}))
-                v = f'"{v}"'
-            args_str.append(f'{k}={v}')
-        config = f"\t\tType {type} : {id} [{', '.join(args_str)}]"
-        self.conf_str = [config]
+        self.type = sys.intern(type)
+        self.id = id
+        self.args = tuple(args.items())
 
-    def get_config(self) -> List[Str]:
-        return self.conf_str
+    def get_config(self) -> List[str]:
+        args_str = list()
+        for k, v in self.args:
+            args_str.append(f'{k}={quote_arg(v)}')
+        return [f"\t\tType {self.type} : {self.id} [{', '.join(args_str)}]"]
 
 class MQTT_Thing(Thing):
+    __slots__ = ('id', 'name', 'broker', 'channels')
+
     def __init__(
         self,
-        id: Str,
-        name: Str,
-        broker: Str,
+        id: str,
+        name: str,
+        broker: str,
         channels: List[MQTT_ThingChannel],
     ) -> None:
-        Thing.__init__(self)
-        self.conf_str.append(
-            f"Thing mqtt:topic:{broker}:{id} \"{name}\" (mqtt:broker:{broker}) {{")
-        self.conf_str.append(
-            f"\tChannels:")
-        for channel in channels:
-            self.conf_str.extend(channel.get_config())
-        self.conf_str.append(f"}}")
+        self.id = id
+        self.name = name
+        self.broker = sys.intern(str(broker))
+        self.channels = tuple(channels)
 
+    def get_uid(self) -> str:
+        return f"mqtt:topic:{self.broker}:{self.id}"
+
+    def get_channels_uids(self) -> List[str]:
+        uid = self.get_uid()
+        return [f"{uid}:{channel.id}" for channel in self.channels]
+
+    def get_config(self) -> List[str]:
+        conf_str = list()
+        conf_str.append(
+            f"Thing mqtt:topic:{self.broker}:{self.id} \"{self.name}\" (mqtt:broker:{self.broker}) {{")
+        conf_str.append(
+            f"\tChannels:")
+        for channel in self.channels:
+            conf_str.extend(channel.get_config())
+        conf_str.append(f"}}")
+        return conf_str
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+    Watch config files for changes (inotify on Linux, polling elsewhere)
+"""
+
+import ctypes
+import ctypes.util
+import logging
+import os
+from pathlib import Path
+import select
+import struct
+import time
+from typing import Callable, Dict, List, Set, Tuple
+
+# inotify events, see inotify(7)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0x00000800
+
+INOTIFY_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+INOTIFY_EVENT = struct.Struct('iIII')
+
+# Wait for more events after first one (editors write files in several steps)
+DEBOUNCE_SEC = 0.02
+
+
+class PollingWatcher:
+    """
+        Detects changed files by periodic scan of mtime and size
+    """
+
+    def __init__(self, dirs: List[Path], match: Callable[[Path], bool], interval: float = 0.25) -> None:
+        self.dirs = dirs
+        self.match = match
+        self.interval = interval
+        self.state = self.scan()
+
+    def scan(self) -> Dict[Path, Tuple[int, int]]:
+        state = {}
+        for dir in self.dirs:
+            if not dir.is_dir():
+                continue
+            for file in dir.iterdir():
+                if not self.match(file):
+                    continue
+                try:
+                    st = file.stat()
+                except FileNotFoundError:
+                    continue
+                state[file] = (st.st_mtime_ns, st.st_size)
+        return state
+
+    def wait(self) -> Set[Path]:
+        while True:
+            time.sleep(self.interval)
+            state = self.scan()
+            changed = {
+                file for file in set(state) | set(self.state)
+                if state.get(file) != self.state.get(file)
+            }
+            self.state = state
+            if changed:
+                return changed
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyWatcher:
+    """
+        Detects changed files with Linux inotify (via libc)
+    """
+
+    def __init__(self, dirs: List[Path], match: Callable[[Path], bool]) -> None:
+        self.match = match
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.wds: Dict[int, Path] = {}
+        for dir in dirs:
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dir), INOTIFY_MASK)
+            if wd < 0:
+                os.close(self.fd)
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {dir}")
+            self.wds[wd] = dir
+
+    def read_events(self) -> Set[Path]:
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return changed
+            pos = 0
+            while pos < len(data):
+                wd, _, _, name_len = INOTIFY_EVENT.unpack_from(data, pos)
+                pos += INOTIFY_EVENT.size
+                name = data[pos:pos + name_len].rstrip(b'\0')
+                pos += name_len
+                if wd not in self.wds or not name:
+                    continue
+                file = self.wds[wd] / os.fsdecode(name)
+                if self.match(file):
+                    changed.add(file)
+
+    def wait(self) -> Set[Path]:
+        while True:
+            select.select([self.fd], [], [])
+            changed = self.read_events()
+            # Collect rest of events from same save operation
+            while select.select([self.fd], [], [], DEBOUNCE_SEC)[0]:
+                changed |= self.read_events()
+            if changed:
+                return changed
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+def create_watcher(dirs: List[Path], match: Callable[[Path], bool]):
+    """
+        Create inotify watcher, fallback to polling if not supported
+    """
+    try:
+        return InotifyWatcher(dirs, match)
+    except (OSError, AttributeError) as e:
+        logging.info("inotify is not available (%s), using polling", e)
+        return PollingWatcher(dirs, match)
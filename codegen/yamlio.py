@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+    YAML loading and dumping: libyaml (C) implementation is used when available
+"""
+
+import logging
+from pathlib import Path
+import re
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import yaml
+from yaml.events import (
+    AliasEvent, MappingEndEvent, MappingStartEvent, NodeEvent, SequenceEndEvent, SequenceStartEvent,
+    StreamEndEvent,
+)
+
+try:
+    from yaml import CSafeLoader as Loader
+except ImportError:
+    from yaml import SafeLoader as Loader
+
+try:
+    from yaml import CSafeDumper as FastDumper
+except ImportError:
+    FastDumper = None
+
+try:
+    from yaml.cyaml import CParser
+    from yaml.composer import Composer
+    from yaml.constructor import SafeConstructor
+    from yaml.resolver import Resolver
+
+    class StreamLoader(CParser, Composer, SafeConstructor, Resolver):
+        """
+            Safe loader, which can compose single nodes from events stream
+        """
+
+        def __init__(self, stream) -> None:
+            CParser.__init__(self, stream)
+            Composer.__init__(self)
+            SafeConstructor.__init__(self)
+            Resolver.__init__(self)
+except ImportError:
+    from yaml import SafeLoader as StreamLoader
+
+# Dumper per payload shape (see get_shape), which was checked to give same output as pure-Python one
+_dumpers: Dict[Any, Any] = {}
+
+
+def load(stream) -> Any:
+    return yaml.load(stream, Loader=Loader)
+
+
+def get_shape(data) -> Any:
+    """
+        Shape of data: collection types with set of shapes of their items, and scalar types.
+        Strings are also told apart by being plain (ASCII, printable, short), as emitters
+        choose style, escaping and line wrapping of other ones
+    """
+    if isinstance(data, dict):
+        return dict, frozenset((get_shape(key), get_shape(value)) for key, value in data.items())
+    if isinstance(data, (list, tuple)):
+        return type(data), frozenset(get_shape(item) for item in data)
+    if isinstance(data, str):
+        return str, data.isascii() and data.isprintable() and len(data) <= 64
+    return type(data)
+
+
+def dump(data) -> str:
+    """
+        Same output as yaml.dump(data). C dumper is verified on first payload of each shape
+        against pure-Python one and is not used for this shape if output differs
+    """
+    shape = get_shape(data)
+    dumper = _dumpers.get(shape, None)
+    if dumper is not None:
+        try:
+            return yaml.dump(data, Dumper=dumper)
+        except yaml.representer.RepresenterError:
+            # Safe dumper: non-plain data, use default one
+            return yaml.dump(data, Dumper=yaml.Dumper)
+    result = yaml.dump(data, Dumper=yaml.Dumper)
+    if not data:
+        # Nothing to verify on
+        return result
+    dumper = yaml.Dumper
+    if FastDumper is not None:
+        try:
+            fast_result = yaml.dump(data, Dumper=FastDumper)
+        except yaml.representer.RepresenterError:
+            fast_result = None
+        if fast_result == result:
+            dumper = FastDumper
+        else:
+            logging.warning("libyaml output differs from pure-Python one, using pure-Python YAML dumper")
+    _dumpers[shape] = dumper
+    return result
+
+
+def skip_node(loader) -> None:
+    """
+        Skip events of one node (scalar, alias or whole collection).
+        Anchored nodes are composed (registered in loader), so aliases
+        to them in following nodes can be resolved
+    """
+    depth = 0
+    while True:
+        event = loader.peek_event()
+        if isinstance(event, NodeEvent) and not isinstance(event, AliasEvent) and event.anchor is not None:
+            loader.compose_node(None, None)
+        else:
+            loader.get_event()
+            if isinstance(event, (MappingStartEvent, SequenceStartEvent)):
+                depth += 1
+            elif isinstance(event, (MappingEndEvent, SequenceEndEvent)):
+                depth -= 1
+        if depth == 0:
+            return
+
+
+def find_key(loader, key: str) -> bool:
+    """
+        Walk top-level mapping of document till key, loader is positioned on its value
+    """
+    # Stream and document start
+    loader.get_event()
+    if loader.check_event(StreamEndEvent):
+        return False
+    loader.get_event()
+    if not loader.check_event(MappingStartEvent):
+        return False
+    loader.get_event()
+    while not loader.check_event(MappingEndEvent):
+        node_key = loader.construct_document(loader.compose_node(None, None))
+        if node_key == key:
+            return True
+        skip_node(loader)
+    return False
+
+
+def load_key(file: Path, key: str, default=None) -> Any:
+    """
+        Value of one top-level key of file, other keys are not constructed
+    """
+    with open(file, 'rb') as stream:
+        loader = StreamLoader(stream)
+        try:
+            if not find_key(loader, key):
+                return default
+            return loader.construct_document(loader.compose_node(None, None))
+        finally:
+            loader.dispose()
+
+
+def iter_key_items(file: Path, key: str) -> Iterator[Any]:
+    """
+        Items of top-level sequence of file, constructed one by one
+        (whole sequence is never kept in memory)
+    """
+    with open(file, 'rb') as stream:
+        loader = StreamLoader(stream)
+        try:
+            if not find_key(loader, key) or not loader.check_event(SequenceStartEvent):
+                return
+            loader.get_event()
+            while not loader.check_event(SequenceEndEvent):
+                yield loader.construct_document(loader.compose_node(None, None))
+        finally:
+            loader.dispose()
+
+
+# Constructs which make document unsafe to be parsed by parts: anchors, aliases, tags,
+# directives, documents separators, complex keys and tabs
+SPLIT_UNSAFE_RE = re.compile(r'(?:^|\s)[&*!]\S|^%|^---|^\.\.\.|^\? |\t', re.M)
+
+
+def split_key_items(text: str, key: str) -> Optional[Tuple[str, str, List[str]]]:
+    """
+        Split document on text before top-level block sequence key, text after it
+        and texts of sequence items. None, if document can't be split safely
+    """
+    if SPLIT_UNSAFE_RE.search(text):
+        return None
+    lines = text.splitlines(keepends=True)
+    header = [idx for idx, line in enumerate(lines) if line.split('#', 1)[0].rstrip() == f'{key}:']
+    if len(header) != 1:
+        return None
+    start = header[0] + 1
+    indent = None
+    items: List[List[str]] = list()
+    end = len(lines)
+    for idx in range(start, len(lines)):
+        line = lines[idx]
+        content = line.lstrip(' ')
+        if not content.strip() or content.startswith('#'):
+            if items:
+                items[-1].append(line)
+            continue
+        line_indent = len(line) - len(content)
+        if indent is None:
+            indent = line_indent
+        is_item = line_indent == indent and (content.startswith('- ') or content.rstrip() == '-')
+        if is_item:
+            items.append([line])
+        elif line_indent > indent and items:
+            items[-1].append(line)
+        elif line_indent == 0:
+            # Next top-level key
+            end = idx
+            break
+        else:
+            return None
+    return ''.join(lines[:start - 1]), ''.join(lines[end:]), [''.join(item) for item in items]
+
+
+def load_by_items(content: bytes, key: str, items_cache: Dict[str, Any]) -> Any:
+    """
+        Parse document, items of top-level block sequence key are parsed one by one,
+        unchanged items (same text) are taken from cache. Cache is replaced by
+        items of this document. Document is parsed at once, if it can't be split safely
+    """
+    split = split_key_items(content.decode('utf-8-sig'), key)
+    try:
+        data = load_split(split, key, items_cache) if split is not None else None
+    except yaml.YAMLError:
+        data = None
+    if data is None:
+        items_cache.clear()
+        return load(content)
+    return data
+
+
+def load_split(split: Tuple[str, str, List[str]], key: str, items_cache: Dict[str, Any]) -> Optional[Dict]:
+    """
+        Document of split parts (see load_by_items), None if parts are not a valid split
+    """
+    head, tail, items_texts = split
+    data = load(head) or {}
+    tail_data = load(tail) or {}
+    if not isinstance(data, dict) or not isinstance(tail_data, dict) or key in data or key in tail_data \
+            or data.keys() & tail_data.keys():
+        return None
+    items = list()
+    cache = dict()
+    for item_text in items_texts:
+        if item_text in items_cache:
+            item = items_cache[item_text]
+        else:
+            parsed = load(item_text)
+            if not isinstance(parsed, list) or len(parsed) != 1:
+                return None
+            item = parsed[0]
+        cache[item_text] = item
+        items.append(item)
+    items_cache.clear()
+    items_cache.update(cache)
+    data[key] = items
+    data.update(tail_data)
+    return data
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+    Device-block-aware diff of generated files
+"""
+
+from typing import List
+import unittest
+
+from codegen.diff import BlockDiff
+
+PREAMBLE = ['// preamble\n']
+
+
+def device(label: str, address: str, body: List[str]) -> List[str]:
+    return [f'// {label} ({address})\n', '// Type / url\n'] + [line + '\n' for line in body]
+
+
+class BlockDiffTest(unittest.TestCase):
+
+    def test_same_label(self):
+        old = PREAMBLE + device('Lamp', 'lamp', ['a1', 'a2']) + device('Lamp', 'lamp', ['b1'])
+        new = PREAMBLE + device('Lamp', 'lamp', ['a1', 'A2']) + device('Lamp', 'lamp', ['b1'])
+        diff = BlockDiff(old, new)
+        self.assertEqual(diff.changed, ['lamp'])
+        self.assertEqual(
+            [line for line in diff.unified('f', 'f') if line[0] in '+-' and not line.startswith(('---', '+++'))],
+            ['-a2\n', '+A2\n'],
+        )
+
+    def test_moved(self):
+        lamp = device('Lamp', 'lamp', ['a1'])
+        plug = device('Plug', 'plug', ['p1'])
+        switch = device('Switch', 'switch', ['s1'])
+        diff = BlockDiff(PREAMBLE + lamp + plug + switch, PREAMBLE + switch + lamp + plug)
+        self.assertEqual(diff.moved, ['switch'])
+        lines = list(diff.unified('f', 'f'))
+        self.assertIn('-s1\n', lines)
+        self.assertIn('+s1\n', lines)
+        self.assertNotIn('-a1\n', lines)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+    Sorted spool (--stream mode devices.yaml) gives same order as yaml.dump
+"""
+
+import unittest
+
+import yaml
+
+from codegen import yamlio
+from codegen.spool import SortedSpool
+
+
+class SortedSpoolTest(unittest.TestCase):
+
+    def assertSameAsDump(self, keys):
+        spool = SortedSpool()
+        try:
+            for key in keys:
+                spool.add(key, yamlio.dump({key: {'friendly_name': str(key)}}))
+            self.assertEqual(
+                ''.join(value for _, value in spool),
+                yaml.dump({key: {'friendly_name': str(key)} for key in keys}),
+            )
+        finally:
+            spool.close()
+
+    def test_string_keys(self):
+        self.assertSameAsDump(['0xb', '0xa', 'B', 'a', 'Лампа'])
+
+    def test_number_keys(self):
+        # Hex zigbee ids are parsed as integers by YAML
+        self.assertSameAsDump([0xa000000000000001, 10, -3, 0, 2.5, -2.5, -100])
+
+    def test_mixed_keys(self):
+        self.assertSameAsDump(['0xb', 0xa, '0x1'])
+
+
+if __name__ == '__main__':
+    unittest.main()
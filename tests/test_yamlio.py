@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+    Streaming YAML loading (--stream mode) gives same data as full loading
+"""
+
+from pathlib import Path
+import tempfile
+import unittest
+
+import yaml
+
+from codegen import yamlio
+
+ALIAS_OUTSIDE_DEVICES = """\
+groups: &grp
+  - g1
+  - g2
+config: &cfg
+  mqtt_topic: zigbee
+devices:
+  - id: a
+    groups: *grp
+  - &dev
+    id: b
+    config: *cfg
+  - *dev
+"""
+
+
+class StreamLoadTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.file = Path(self.dir.name) / 'site.yaml'
+        self.file.write_text(ALIAS_OUTSIDE_DEVICES)
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    def test_alias_to_anchor_outside_devices(self):
+        data = yamlio.load(ALIAS_OUTSIDE_DEVICES)
+        self.assertEqual(list(yamlio.iter_key_items(self.file, 'devices')), data['devices'])
+
+    def test_load_key(self):
+        self.assertEqual(yamlio.load_key(self.file, 'config'), {'mqtt_topic': 'zigbee'})
+        self.assertIsNone(yamlio.load_key(self.file, 'missing'))
+
+
+class DumpTest(unittest.TestCase):
+
+    def test_same_as_yaml_dump(self):
+        payloads = [
+            {'0xa1': {'friendly_name': 'Lamp'}},
+            {'0xa2': {'friendly_name': 'Лампа в коридоре'}},
+            {'0xa3': {'friendly_name': 'Lamp ' * 30, 'retain': True, 'qos': 1}},
+            {'0xa4': {'friendly_name': 'Lamp'}, 5: ['a', 'b\nc']},
+        ]
+        for data in payloads:
+            self.assertEqual(yamlio.dump(data), yaml.dump(data))
+            # Second payload of same shape uses verified dumper
+            self.assertEqual(yamlio.dump(data), yaml.dump(data))
+
+    def test_shape(self):
+        self.assertEqual(yamlio.get_shape({'a': 'x', 'b': 'y'}), yamlio.get_shape({'c': 'z'}))
+        self.assertNotEqual(yamlio.get_shape({'a': 'x'}), yamlio.get_shape({'a': 'ж'}))
+        self.assertNotEqual(yamlio.get_shape({'a': 'x'}), yamlio.get_shape({1: 'x'}))
+
+
+if __name__ == '__main__':
+    unittest.main()